@@ -0,0 +1,17 @@
+"""
+Headless core of Graph Monster: the graph model and its edits (model,
+store), files (fileio, autosave), layout, text outputs (output), pictures
+(render) and the spatial index used to find elements by position (spatial).
+None of it needs Tk, so graphs can be built, laid out and exported from
+scripts; the editor is a view subscribed to the change events (events) of
+a Graph.
+"""
+from .store import GraphStore, Node, Line, NodeMap, LineMap
+from .model import Graph
+from .layout import ForceLayout
+from .spatial import SpatialGrid
+
+__all__ = [
+    "GraphStore", "Node", "Line", "NodeMap", "LineMap", "Graph",
+    "ForceLayout", "SpatialGrid",
+]
@@ -0,0 +1,125 @@
+"""
+Background autosave for Graph Monster.
+
+The Tk thread only hands over immutable snapshots (tuples of node and edge
+records, see Graph.fileio); a worker thread diffs them against what is already
+on disk and appends the differences to a JSON-lines journal:
+    {"op": "base", "nodes": [...], "edges": [...]}
+    {"op": "delta", "nodes": [...], "edges": [...], "dropNodes": [...], "dropEdges": [...]}
+Every few deltas the journal is compacted into a single "base" line.
+"""
+from threading import Thread
+from queue import Queue
+from os import replace
+from os.path import exists
+import json
+
+
+class Autosaver:
+
+    def __init__(self, path, compactEvery=50):
+        self.path = path
+        self.compactEvery = compactEvery
+        self.nodeBook = None
+        self.edgeBook = None
+        self.deltas = 0
+        self.file = None
+        # Keep the journal of the previous session for restoring
+        if exists(path):
+            replace(path, path + ".last")
+        self.queue = Queue()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, nodes, edges):
+        """
+        Called from the Tk thread; returns at once
+        """
+        self.queue.put((tuple(nodes), tuple(edges)))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        stop = False
+        while not stop:
+            snapshot = self.queue.get()
+            stop = snapshot is None
+            # Only the latest snapshot is worth writing
+            while not self.queue.empty():
+                latest = self.queue.get_nowait()
+                if latest is None:
+                    stop = True
+                else:
+                    snapshot = latest
+            if snapshot is not None:
+                self.write(*snapshot)
+        if self.file:
+            self.file.close()
+
+    def write(self, nodes, edges):
+        nodeBook = {node[0]: node for node in nodes}
+        edgeBook = {edge[:2]: edge for edge in edges}
+        if self.nodeBook is None or self.deltas >= self.compactEvery:
+            self.compact(nodeBook, edgeBook)
+        else:
+            delta = {
+                "op": "delta",
+                "nodes": [
+                    node for label, node in nodeBook.items()
+                    if self.nodeBook.get(label) != node
+                ],
+                "edges": [
+                    edge for key, edge in edgeBook.items()
+                    if self.edgeBook.get(key) != edge
+                ],
+                "dropNodes": [x for x in self.nodeBook if x not in nodeBook],
+                "dropEdges": [x for x in self.edgeBook if x not in edgeBook],
+            }
+            if any(delta[key] for key in delta if key != "op"):
+                self.file.write(json.dumps(delta) + "\n")
+                self.file.flush()
+                self.deltas += 1
+        self.nodeBook, self.edgeBook = nodeBook, edgeBook
+
+    def compact(self, nodeBook, edgeBook):
+        if self.file:
+            self.file.close()
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(
+                json.dumps({
+                    "op": "base",
+                    "nodes": list(nodeBook.values()),
+                    "edges": list(edgeBook.values()),
+                }) + "\n")
+        replace(self.path + ".tmp", self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.deltas = 0
+
+
+def readJournal(path):
+    """
+    Replay a journal into (nodes, edges) records.
+    A torn last line left by a crash is ignored.
+    """
+    nodeBook = {}
+    edgeBook = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if entry["op"] == "base":
+                nodeBook.clear()
+                edgeBook.clear()
+            for label in entry.get("dropNodes", ()):
+                nodeBook.pop(label, None)
+            for key in entry.get("dropEdges", ()):
+                edgeBook.pop(tuple(key), None)
+            for node in entry["nodes"]:
+                nodeBook[node[0]] = tuple(node)
+            for edge in entry["edges"]:
+                edgeBook[tuple(edge[:2])] = tuple(edge)
+    return list(nodeBook.values()), list(edgeBook.values())
@@ -0,0 +1,96 @@
+"""
+Typed change events of a Graph and the bus delivering them.
+
+Events are published right after the change. Edits made of several changes,
+like removing a node together with its edges or relabelling every node, are
+wrapped in BatchBegin / BatchEnd. Positions are those of the world plane.
+"""
+from typing import NamedTuple
+
+
+class NodeAdded(NamedTuple):
+    tag: int
+
+
+class NodeMoved(NamedTuple):
+    tag: int
+    oldX: float
+    oldY: float
+
+
+class NodeRelabeled(NamedTuple):
+    tag: int
+
+
+class NodeRemoved(NamedTuple):
+    tag: int
+    # where the node was
+    x: float
+    y: float
+
+
+class EdgeAdded(NamedTuple):
+    tag: int
+
+
+class EdgeReweighted(NamedTuple):
+    tag: int
+
+
+class EdgeRemoved(NamedTuple):
+    tag: int
+    # where the edge was
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+
+class LayoutStepped(NamedTuple):
+    """
+    Any node may have moved
+    """
+
+
+class GraphLoaded(NamedTuple):
+    """
+    The whole graph was replaced (undo, redo, files)
+    """
+
+
+class BatchBegin(NamedTuple):
+    """
+    An edit made of several changes starts
+    """
+
+
+class BatchEnd(NamedTuple):
+    """
+    The edit started by the last BatchBegin is complete
+    """
+
+
+class EventBus:
+
+    def __init__(self):
+        # {event type: [listener, ]}; None holds the listeners of every type
+        self.listeners = {}
+
+    def subscribe(self, listener, *eventTypes):
+        """
+        Call listener(event) for the events of the types, or for every event
+        if no type is given
+        """
+        for eventType in eventTypes or (None, ):
+            self.listeners.setdefault(eventType, []).append(listener)
+
+    def unsubscribe(self, listener):
+        for listeners in self.listeners.values():
+            if listener in listeners:
+                listeners.remove(listener)
+
+    def publish(self, event):
+        for listener in self.listeners.get(type(event), ()):
+            listener(event)
+        for listener in self.listeners.get(None, ()):
+            listener(event)
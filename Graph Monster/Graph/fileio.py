@@ -0,0 +1,741 @@
+"""
+Streaming import/export helpers for Graph Monster.
+
+Graphs travel through these functions as plain records so that no
+Tk or Node/Line object is needed here:
+    node record: (label, x, y)
+    edge record: (label1, label2, weight)
+"""
+from xml.etree.ElementTree import iterparse
+from concurrent.futures import ProcessPoolExecutor
+from io import RawIOBase, BufferedReader, BufferedWriter
+from array import array
+import zlib
+import lzma
+import bz2
+from itertools import repeat
+from os import cpu_count, fstat
+from xml.sax.saxutils import escape, quoteattr
+from pickle import Unpickler, UnpicklingError
+from ast import literal_eval
+import json
+
+GRAPHML_NS = "http://graphml.graphdrawing.org/xmlns"
+GEXF_NS = "http://gexf.net/1.3"
+GEXF_VIZ_NS = "http://gexf.net/1.3/viz"
+# Types of the edge weights accepted from users and from files
+WEIGHTTYPES = (int, float, str)
+# Bytes of an edge list parsed by one worker
+PARALLELCHUNKSIZE = 1 << 24
+# Bytes read or written at once through a codec
+COMPRESSIONBLOCK = 1 << 16
+CODECS = ("none", "zlib", "lzma", "bz2")
+
+
+def localName(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parseLabel(text):
+    """ Labels drawn by Graph Monster are integers; keep the others as text """
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def parseToken(token):
+    """
+    Label read from a file: integers written the way Graph Monster writes
+    them are read back as integers, any other text is kept as it is, so
+    different labels never read back as the same one
+    """
+    label = parseLabel(token)
+    return label if str(label) == token else token
+
+
+def parseNumber(text, default=None):
+    if text is None:
+        return default
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parseWeight(text):
+    """
+    Parse an edge weight typed by the user: a number or a string literal
+    """
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    weight = literal_eval(text)
+    if type(weight) not in WEIGHTTYPES:
+        raise ValueError(f"Unsupported weight {text}")
+    return weight
+
+
+def iterGraphML(file):
+    """
+    Incrementally parse a GraphML file and yield
+        ("node", nodeId, label, x, y)
+        ("edge", sourceId, targetId, weight)
+    Every <node>/<edge> element is dropped right after it is read,
+    so memory usage does not grow with the size of the document.
+    """
+    keys = {}  # key id -> attr.name
+    graph = None
+    for event, elem in iterparse(file, events=("start", "end")):
+        tag = localName(elem.tag)
+        if event == "start":
+            if tag == "graph" and graph is None:
+                graph = elem
+            continue
+        if tag == "key":
+            keys[elem.get("id")] = elem.get("attr.name", elem.get("id"))
+        elif tag in ("node", "edge"):
+            attrs = {
+                keys.get(child.get("key"), child.get("key")): child.text
+                for child in elem if localName(child.tag) == "data"
+            }
+            if tag == "node":
+                nodeId = elem.get("id")
+                yield (
+                    "node",
+                    nodeId,
+                    parseToken(attrs.get("label") or nodeId),
+                    parseNumber(attrs.get("x")),
+                    parseNumber(attrs.get("y")),
+                )
+            else:
+                yield (
+                    "edge",
+                    elem.get("source"),
+                    elem.get("target"),
+                    parseNumber(attrs.get("weight"), 1),
+                )
+            elem.clear()
+            if graph is not None:
+                del graph[:]
+
+
+def iterGEXF(file):
+    """
+    Incrementally parse a GEXF file, yielding the same records as iterGraphML.
+    """
+    container = None
+    for event, elem in iterparse(file, events=("start", "end")):
+        tag = localName(elem.tag)
+        if event == "start":
+            if tag in ("nodes", "edges"):
+                container = elem
+            continue
+        if tag == "node":
+            x = y = None
+            for child in elem:
+                if localName(child.tag) == "position":
+                    x = parseNumber(child.get("x"))
+                    y = parseNumber(child.get("y"))
+            nodeId = elem.get("id")
+            yield (
+                "node",
+                nodeId,
+                parseToken(elem.get("label") or nodeId),
+                x,
+                y,
+            )
+        elif tag == "edge":
+            yield (
+                "edge",
+                elem.get("source"),
+                elem.get("target"),
+                parseNumber(elem.get("weight"), 1),
+            )
+        else:
+            continue
+        elem.clear()
+        if container is not None:
+            del container[:]
+
+
+def readGraph(file, reader):
+    """
+    Collect the records of reader(file) into
+        (nodes, edges) = ([(label, x, y)], [(label1, label2, weight)])
+    Self-loops and repeated edges are skipped since Graph Monster draws neither.
+    Nodes are identified by their labels, so repeated labels fall back to ids.
+    """
+    labels = {}
+    used = set()
+    nodes = []
+    pending = []
+    for record in reader(file):
+        if record[0] == "node":
+            _, nodeId, label, x, y = record
+            if label in used:
+                label = nodeId
+            used.add(label)
+            labels[nodeId] = label
+            nodes.append((label, x, y))
+        else:
+            pending.append(record[1:])
+    for source, target, _ in pending:
+        if source not in labels or target not in labels:
+            raise ValueError(f"Edge ({source}, {target}) has unknown end")
+    edges = dropInvalidEdges(
+        (labels[source], labels[target], weight)
+        for source, target, weight in pending)
+    return nodes, list(edges)
+
+
+def dropInvalidEdges(edges):
+    seen = set()
+    for label1, label2, weight in edges:
+        key = (label1, label2)
+        if label1 == label2 or key in seen:
+            continue
+        seen.add(key)
+        yield label1, label2, weight
+
+
+def readGraphML(file):
+    return readGraph(file, iterGraphML)
+
+
+def readGEXF(file):
+    return readGraph(file, iterGEXF)
+
+
+def writeGraphML(file, nodes, edges):
+    """
+    Stream a GraphML document to the binary file element by element.
+    Weights may be text, so they are declared as strings.
+    """
+    write = lambda text: file.write(text.encode("utf-8"))
+    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+          f'<graphml xmlns="{GRAPHML_NS}">\n'
+          '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+          '  <key id="x" for="node" attr.name="x" attr.type="double"/>\n'
+          '  <key id="y" for="node" attr.name="y" attr.type="double"/>\n'
+          '  <key id="weight" for="edge" attr.name="weight" attr.type="string"/>\n'
+          '  <graph id="G" edgedefault="directed">\n')
+    for label, x, y in nodes:
+        write(f'    <node id={quoteattr(str(label))}>'
+              f'<data key="label">{escape(str(label))}</data>'
+              f'<data key="x">{x}</data>'
+              f'<data key="y">{y}</data></node>\n')
+    for label1, label2, weight in edges:
+        write(f'    <edge source={quoteattr(str(label1))} '
+              f'target={quoteattr(str(label2))}>'
+              f'<data key="weight">{escape(str(weight))}</data></edge>\n')
+    write('  </graph>\n</graphml>\n')
+
+
+def writeGEXF(file, nodes, edges):
+    """
+    Stream a GEXF document to the binary file element by element.
+    """
+    write = lambda text: file.write(text.encode("utf-8"))
+    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+          f'<gexf xmlns="{GEXF_NS}" xmlns:viz="{GEXF_VIZ_NS}" version="1.3">\n'
+          '  <graph defaultedgetype="directed">\n'
+          '    <nodes>\n')
+    for label, x, y in nodes:
+        write(f'      <node id={quoteattr(str(label))} '
+              f'label={quoteattr(str(label))}>'
+              f'<viz:position x="{x}" y="{y}" z="0.0"/></node>\n')
+    write('    </nodes>\n'
+          '    <edges>\n')
+    for i, (label1, label2, weight) in enumerate(edges):
+        write(f'      <edge id="{i}" source={quoteattr(str(label1))} '
+              f'target={quoteattr(str(label2))} '
+              f'weight={quoteattr(str(weight))}/>\n')
+    write('    </edges>\n'
+          '  </graph>\n</gexf>\n')
+
+
+def splitRanges(file, chunkSize):
+    """
+    Cut the binary file into (start, end) byte ranges of about chunkSize
+    bytes, every range ending right after a newline
+    """
+    size = fstat(file.fileno()).st_size
+    ranges = []
+    start = 0
+    while start < size:
+        file.seek(min(start + chunkSize, size))
+        file.readline()
+        end = min(file.tell(), size)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def parseEdgeChunk(path, start, end):
+    """
+    Worker of readEdgeList: parse the lines in [start, end) of the file
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        return parseEdgeLines(
+            file.read(end - start).decode("utf-8").splitlines())
+
+
+def parseEdgeLines(lines):
+    """
+    Return (labels, sources, targets, weights) where labels is the local
+    label table and sources/targets index into it.
+    A line holding a single label declares an isolated node.
+    Weights are kept as parsed, so integers of any size stay integers.
+    """
+    labels = []
+    index = {}
+    sources = array("l")
+    targets = array("l")
+    weights = []
+    for line in lines:
+        tokens = line.split()
+        if not tokens or tokens[0][0] in "#%":
+            continue
+        ids = []
+        for token in tokens[:2]:
+            if token not in index:
+                index[token] = len(labels)
+                labels.append(parseToken(token))
+            ids.append(index[token])
+        if len(ids) == 1:
+            continue
+        weight = parseNumber(tokens[2] if len(tokens) > 2 else None, 1)
+        sources.append(ids[0])
+        targets.append(ids[1])
+        weights.append(weight)
+    return labels, sources, targets, weights
+
+
+def iterEdgeList(file):
+    """
+    Parse an edge list line by line, yielding the same records as
+    iterGraphML; a node record comes before the first edge of the node
+    """
+    known = set()
+    for line in file:
+        tokens = line.decode("utf-8").split()
+        if not tokens or tokens[0][0] in "#%":
+            continue
+        for token in tokens[:2]:
+            if token not in known:
+                known.add(token)
+                yield "node", token, parseToken(token), None, None
+        if len(tokens) > 1:
+            yield (
+                "edge",
+                tokens[0],
+                tokens[1],
+                parseNumber(tokens[2] if len(tokens) > 2 else None, 1),
+            )
+
+
+def readEdgeList(file, workers=None, plain=False):
+    """
+    Read an edge list ("label1 label2 [weight]" per line).
+    If plain, file is an uncompressed file on disk: big files are then split
+    at newline boundaries and parsed by a pool of processes. Other streams
+    are parsed block by block. The per-chunk label tables are then merged
+    into one index.
+    """
+    workers = workers or cpu_count() or 1
+    path = getattr(file, "name", None) if plain else None
+    if not isinstance(path, str):
+        # A decompressing stream can not be cut by byte offsets
+        chunks = []
+        while block := file.read(PARALLELCHUNKSIZE):
+            block += file.readline()
+            chunks.append(parseEdgeLines(block.decode("utf-8").splitlines()))
+    else:
+        ranges = splitRanges(file, PARALLELCHUNKSIZE)
+        if workers == 1 or len(ranges) <= 1:
+            chunks = [parseEdgeChunk(path, *r) for r in ranges]
+        else:
+            with ProcessPoolExecutor(min(workers, len(ranges))) as pool:
+                chunks = list(
+                    pool.map(parseEdgeChunk, repeat(path), *zip(*ranges)))
+    nodes = []
+    known = set()
+    edges = []
+    for labels, sources, targets, weights in chunks:
+        for label in labels:
+            if label not in known:
+                known.add(label)
+                nodes.append((label, None, None))
+        edges.extend(
+            (labels[i], labels[j], w)
+            for i, j, w in zip(sources, targets, weights))
+    return nodes, list(dropInvalidEdges(edges))
+
+
+def edgeListToken(value, parse, isLabel=True):
+    """
+    Text of a label or weight in an edge list; raise ValueError if it would
+    not read back as the same value (empty, holding whitespace, a label
+    taken for a comment, or text read back as a number)
+    """
+    text = str(value)
+    if text.split() != [text] or isLabel and text[0] in "#%":
+        raise ValueError(f"{value!r} can not be written to an edge list")
+    parsed = parse(text)
+    if type(parsed) is not type(value) or parsed != value:
+        raise ValueError(f"{value!r} can not be written to an edge list")
+    return text
+
+
+def writeEdgeList(file, nodes, edges):
+    """
+    Stream an edge list to the binary file; nodes go first, one per line.
+    Labels and weights which would not read back the same raise ValueError.
+    """
+    for label, _, _ in nodes:
+        file.write(f"{edgeListToken(label, parseToken)}\n".encode("utf-8"))
+    for label1, label2, weight in edges:
+        file.write(f"{edgeListToken(label1, parseToken)} "
+                   f"{edgeListToken(label2, parseToken)} "
+                   f"{edgeListToken(weight, parseNumber, False)}\n".encode(
+                       "utf-8"))
+
+
+class LegacyNode:
+    """
+    Stand-in for the Node of the pickled .gmg files; only data is restored
+    """
+
+
+class LegacyLine:
+    """
+    Stand-in for the Line of the pickled .gmg files; only data is restored
+    """
+
+
+class RestrictedUnpickler(Unpickler):
+    """
+    Unpickler for legacy .gmg/.gms files that refuses every global except
+    the Node and Line classes of Graph Monster
+    """
+
+    CLASSES = {"Node": LegacyNode, "Line": LegacyLine}
+
+    def find_class(self, module, name):
+        if (module == "__main__" or module.startswith("Graph_Monster")) \
+                and name in self.CLASSES:
+            return self.CLASSES[name]
+        raise UnpicklingError(f"Global {module}.{name} is forbidden")
+
+
+def isNumber(x):
+    return type(x) in (int, float)
+
+
+def checkGraph(nodes, edges):
+    """
+    Validate node records (label, x, y) and edge records
+    (label1, label2, weight); raise ValueError on the first problem
+    """
+    labels = set()
+    for node in nodes:
+        if len(node) != 3 or type(node[0]) not in (int, str) or \
+                not isNumber(node[1]) or not isNumber(node[2]):
+            raise ValueError(f"Invalid node {node!r}")
+        if node[0] in labels:
+            raise ValueError(f"Repeated node {node[0]!r}")
+        labels.add(node[0])
+    for edge in edges:
+        if len(edge) != 3 or edge[0] not in labels or edge[1] not in labels:
+            raise ValueError(f"Invalid edge {edge!r}")
+        if type(edge[2]) not in WEIGHTTYPES:
+            raise ValueError(f"Invalid weight {edge[2]!r}")
+
+
+def peekHead(file, size):
+    """
+    First bytes of the binary file, left unread
+    """
+    if hasattr(file, "peek"):
+        return file.peek(size)[:size]
+    head = file.read(size)
+    file.seek(-len(head), 1)
+    return head
+
+
+def readLegacyGraph(file):
+    """
+    Turn a pickled .gmg file into node and edge records
+    """
+    data = RestrictedUnpickler(file).load()
+    nodes = []
+    for coord, node in data["Node"].items():
+        x, y = (coord[0] + coord[2]) / 2, (coord[1] + coord[3]) / 2
+        nodes.append((node.val, x / node.scale, y / node.scale))
+    edges = [(line.node1.val, line.node2.val, line.weight)
+             for line in data["Line"]]
+    return nodes, edges
+
+
+def readNative(file):
+    """
+    Read a .gmg file. The native format is a JSON document
+        {"format": "Graph Monster", "version": 1,
+         "nodes": [[label, x, y], ...], "edges": [[label1, label2, weight], ...]}
+    Files pickled by earlier versions are still accepted.
+    """
+    if peekHead(file, 1) == b"\x80":
+        nodes, edges = readLegacyGraph(file)
+    else:
+        doc = json.load(file)
+        if not isinstance(doc, dict) or doc.get("format") != "Graph Monster" \
+                or doc.get("version") != 1:
+            raise ValueError("Not a Graph Monster graph")
+        nodes = [tuple(node) for node in doc["nodes"]]
+        edges = [tuple(edge) for edge in doc["edges"]]
+    checkGraph(nodes, edges)
+    return nodes, edges
+
+
+def writeNative(file, nodes, edges):
+    """
+    Stream a native .gmg document to the binary file record by record
+    """
+    write = lambda text: file.write(text.encode("utf-8"))
+    write('{"format": "Graph Monster", "version": 1,\n "nodes": [')
+    sep = "\n  "
+    for node in nodes:
+        write(sep + json.dumps(node))
+        sep = ",\n  "
+    write('],\n "edges": [')
+    sep = "\n  "
+    for edge in edges:
+        write(sep + json.dumps(edge))
+        sep = ",\n  "
+    write(']}\n')
+
+
+# {extension: (reader, writer)}
+GRAPHFORMATS = {
+    ".gmg": (readNative, writeNative),
+    ".graphml": (readGraphML, writeGraphML),
+    ".gexf": (readGEXF, writeGEXF),
+    ".txt": (readEdgeList, writeEdgeList),
+    ".edges": (readEdgeList, writeEdgeList),
+}
+# {extension: record iterator} of the formats which can be streamed
+STREAMREADERS = {
+    ".graphml": iterGraphML,
+    ".gexf": iterGEXF,
+    ".txt": iterEdgeList,
+    ".edges": iterEdgeList,
+}
+
+
+def checkStyle(style, nodeMode, lineMode):
+    for which in ("Node", "Line"):
+        part = style[which]
+        if not isinstance(part["unit"], str) or \
+                not isinstance(part["sep"], str) or \
+                len(part["list"]) != 2 or \
+                not all(isinstance(x, str) for x in part["list"]):
+            raise ValueError(f"Invalid {which} style")
+    if nodeMode not in (0, 1) or lineMode not in (0, 1):
+        raise ValueError("Invalid style mode")
+
+
+def readStyle(file):
+    """
+    Read a .gms file into (style, nodeMode, lineMode).
+    Files pickled by earlier versions are still accepted.
+    """
+    if peekHead(file, 1) == b"\x80":
+        style, nodeMode, lineMode = RestrictedUnpickler(file).load()
+    else:
+        doc = json.load(file)
+        if not isinstance(doc, dict) or \
+                doc.get("format") != "Graph Monster Style" or \
+                doc.get("version") != 1:
+            raise ValueError("Not a Graph Monster style")
+        style, nodeMode, lineMode = doc["style"], doc["nodeMode"], \
+            doc["lineMode"]
+    checkStyle(style, nodeMode, lineMode)
+    return style, nodeMode, lineMode
+
+
+def writeStyle(file, style, nodeMode, lineMode):
+    doc = {
+        "format": "Graph Monster Style",
+        "version": 1,
+        "style": style,
+        "nodeMode": nodeMode,
+        "lineMode": lineMode,
+    }
+    file.write(json.dumps(doc, indent=1).encode("utf-8"))
+
+
+class ZlibReader(RawIOBase):
+    """
+    Decompress a zlib stream while it is being read
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.decompressor = zlib.decompressobj()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.decompressor.unconsumed_tail:
+                data = self.decompressor.unconsumed_tail
+            elif self.decompressor.eof:
+                return 0
+            elif not (data := self.file.read(COMPRESSIONBLOCK)):
+                raise EOFError("Compressed file ended before the "
+                               "end-of-stream marker was reached")
+            out = self.decompressor.decompress(data, len(buffer))
+            if out:
+                buffer[:len(out)] = out
+                return len(out)
+
+
+class ZlibWriter(RawIOBase):
+    """
+    Compress everything written into a zlib stream
+    """
+
+    def __init__(self, file, level=6):
+        self.file = file
+        self.compressor = zlib.compressobj(level)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.file.write(self.compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.file.write(self.compressor.flush())
+        super().close()
+
+
+class PlainWriter(RawIOBase):
+    """
+    Pass writes through without closing the underlying file
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.file.write(data)
+
+
+def detectCodec(head):
+    if head.startswith(b"BZh"):
+        return "bz2"
+    if head.startswith(b"\xfd7zXZ\x00"):
+        return "lzma"
+    if head[:2] in (b"\x78\x01", b"\x78\x5e", b"\x78\x9c", b"\x78\xda"):
+        return "zlib"
+    return "none"
+
+
+def openReader(file):
+    """
+    Return a stream of the decompressed content of the binary file.
+    The codec is told by the magic bytes; plain files are returned as they are.
+    """
+    codec = detectCodec(peekHead(file, 6))
+    if codec == "bz2":
+        return bz2.BZ2File(file)
+    if codec == "lzma":
+        return lzma.LZMAFile(file)
+    if codec == "zlib":
+        return BufferedReader(ZlibReader(file), COMPRESSIONBLOCK)
+    return file
+
+
+def readGraphFile(file, ext):
+    """
+    Records of a binary graph file of the format of extension ext, maybe
+    compressed; unknown extensions are read as .gmg
+    """
+    reader = GRAPHFORMATS.get(ext, GRAPHFORMATS[".gmg"])[0]
+    stream = openReader(file)
+    if reader is readEdgeList:
+        # openReader hands plain files back as they are
+        return readEdgeList(stream, plain=stream is file)
+    return reader(stream)
+
+
+def streamGraphFile(path, ext):
+    """
+    (nodes, edges) of the graph file at path, where only the node records
+    are held: edges is an iterator reading the file a second time, so
+    pictures of graphs of any size can be drawn. Self-loops and edges with
+    an unknown end are skipped, repeated edges are not. .gmg documents are
+    read whole.
+    """
+    iterate = STREAMREADERS.get(ext)
+    if iterate is None:
+        with open(path, "rb") as file:
+            return readGraphFile(file, ext)
+    labels = {}
+    used = set()
+    nodes = []
+    with open(path, "rb") as file:
+        for record in iterate(openReader(file)):
+            if record[0] == "node":
+                _, nodeId, label, x, y = record
+                if label in used:
+                    label = nodeId
+                used.add(label)
+                labels[nodeId] = label
+                nodes.append((label, x, y))
+
+    def iterEdges():
+        with open(path, "rb") as file:
+            for record in iterate(openReader(file)):
+                if record[0] == "edge":
+                    _, source, target, weight = record
+                    if source in labels and target in labels and \
+                            source != target:
+                        yield labels[source], labels[target], weight
+
+    return nodes, iterEdges()
+
+
+def openWriter(file, codec="none"):
+    """
+    Return a stream compressing into the binary file with the codec.
+    Closing the stream finishes the compressed data but keeps the file open.
+    """
+    if codec == "bz2":
+        return bz2.BZ2File(file, "wb")
+    if codec == "lzma":
+        return lzma.LZMAFile(file, "wb")
+    if codec == "zlib":
+        return BufferedWriter(ZlibWriter(file), COMPRESSIONBLOCK)
+    return BufferedWriter(PlainWriter(file), COMPRESSIONBLOCK)
+
@@ -0,0 +1,130 @@
+"""
+Force-directed layout of a GraphStore.
+
+Edges are springs pulling their nodes towards an ideal length, summed once
+per edge (an edge and its reverse make a single spring); nodes which are
+not neighbours push each other away when closer than a threshold.
+Positions, velocities and accelerations are those of the store columns.
+Nodes read from files without a position are first put on a circle.
+"""
+from math import atan2, cos, sin, pi
+
+
+def placeNodes(nodes, nodeSize=20):
+    """
+    {label: (x, y)} of node records; nodes without a position are placed
+    on a circle
+    """
+    nodes = list(nodes)
+    radius = max(300, len(nodes) * nodeSize * 3 / (2 * pi))
+    positions = {}
+    for i, (label, x, y) in enumerate(nodes):
+        if x is None or y is None:
+            deg = 2 * pi * i / len(nodes)
+            x, y = radius * (1 + cos(deg)), radius * (1 + sin(deg))
+        positions[label] = (x, y)
+    return positions
+
+
+class ForceLayout:
+
+    def __init__(self,
+                 damping=.1,
+                 nodeMass=15,
+                 elasticity=1,
+                 idealEdgeLen=300,
+                 repelFactor=40,
+                 repelThreshold=200.0,
+                 motionTolerance=1e-4):
+        self.damping = damping
+        self.nodeMass = nodeMass
+        self.elasticity = elasticity
+        self.idealEdgeLen = idealEdgeLen
+        self.repelFactor = repelFactor
+        self.repelThreshold = repelThreshold
+        self.motionTolerance = motionTolerance
+
+    def checkParas(self):
+        return 0.05 <= self.damping <= 0.95 and \
+                10 <= self.nodeMass <= 100 and \
+                0.5 <= self.elasticity <= 10 and \
+                1 <= self.idealEdgeLen and \
+                10 <= self.repelFactor <= 75
+
+    def step(self, store, holding=None):
+        """
+        Move every node but the one of id holding by one step;
+        return 1 once the graph came to rest, else 0
+        """
+        if not store.nodeCount: return 1
+        # Forces are computed from the positions at the start of the step
+        xs, ys = store.x[:], store.y[:]
+        fxs = [0] * len(xs)
+        fys = [0] * len(xs)
+        # Springs along the edges, once per pair of connected nodes
+        for node1, node2 in zip(store.source, store.target):
+            if node1 == -1 or node1 == node2 or \
+                    node1 > node2 and store.findEdge(node2, node1) is not None:
+                continue
+            dfx, dfy = self.getForce((xs[node1], ys[node1]),
+                                     (xs[node2], ys[node2]))
+            fxs[node1] += dfx
+            fys[node1] += dfy
+            fxs[node2] -= dfx
+            fys[node2] -= dfy
+        tags = list(store.nodeIds())
+        # Only rebuilt after the topology changed; neighbours do not repel
+        neighborBook = store.getNeighbors()
+        for tag in tags:
+            if tag == holding: continue
+            fx, fy = fxs[tag], fys[tag]
+            adjNodeTags = neighborBook[tag]
+            startCoord = (xs[tag], ys[tag])
+            # Repulsion from the other nodes
+            for endTag in tags:
+                if endTag != tag and endTag not in adjNodeTags:
+                    dfx, dfy = self.getRepel(startCoord,
+                                             (xs[endTag], ys[endTag]))
+                    fx += dfx
+                    fy += dfy
+            self.setNodeAcc(store, tag, fx, fy)
+            deltaS = self.move(store, tag)
+            store.x[tag] += deltaS[0]
+            store.y[tag] += deltaS[1]
+            if not adjNodeTags:
+                store.ax[tag] = store.ay[tag] = 0
+                store.vx[tag] = store.vy[tag] = 0
+        # Check for motion status, whatever the direction
+        for tag in tags:
+            if max(abs(store.ax[tag]), abs(store.ay[tag])) >= \
+                    self.motionTolerance and \
+                    max(abs(store.vx[tag]), abs(store.vy[tag])) >= \
+                    self.motionTolerance:
+                return 0
+        return 1
+
+    def setNodeAcc(self, store, tag, fx, fy):
+        store.ax[tag] = fx / self.nodeMass
+        store.ay[tag] = fy / self.nodeMass
+
+    def move(self, store, tag):
+        store.vx[tag] = (store.vx[tag] + store.ax[tag]) * (1 - self.damping)
+        store.vy[tag] = (store.vy[tag] + store.ay[tag]) * (1 - self.damping)
+        return store.vx[tag], store.vy[tag]
+
+    def getForce(self, startCoord, endCoord):
+        (x1, y1), (x2, y2) = startCoord, endCoord
+        d = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+        f = self.elasticity * (d - self.idealEdgeLen)
+        deg = atan2((y2 - y1), (x1 - x2))
+        return -f * cos(deg), f * sin(deg)
+
+    def getRepel(self, startCoord, endCoord):
+        (x1, y1), (x2, y2) = startCoord, endCoord
+        d = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+        length = self.repelThreshold
+        if d > length:
+            return 0, 0
+        f = -length / ((d + 1e-3) / self.repelFactor)**2
+        deg = atan2((y2 - y1), (x1 - x2))
+        return -f * cos(deg), f * sin(deg)
@@ -0,0 +1,226 @@
+"""
+The graph edited by Graph Monster, without any display.
+
+Graph wraps a GraphStore with the edit operations of the editor, an undo
+history, file import/export and the force layout. Views subscribe to the
+typed events of Graph.events, which tell what changed after every edit.
+Example:
+    from Graph import Graph, ForceLayout
+    graph = Graph()
+    a, b = graph.addNode(x=0, y=0), graph.addNode(x=300, y=0)
+    graph.addLine(a, b, 2)
+    while not graph.layoutStep(ForceLayout()): pass
+    with open("graph.graphml", "wb") as file:
+        graph.write(file, ".graphml")
+"""
+from contextlib import contextmanager
+from .store import GraphStore, NodeMap, LineMap
+from .events import EventBus, NodeAdded, NodeMoved, NodeRelabeled, \
+                    NodeRemoved, EdgeAdded, EdgeReweighted, EdgeRemoved, \
+                    LayoutStepped, GraphLoaded, BatchBegin, BatchEnd
+from .fileio import GRAPHFORMATS, openWriter, readGraphFile
+from .layout import placeNodes
+
+
+class Graph:
+
+    def __init__(self):
+        self.store = GraphStore()
+        self.data = {"Node": NodeMap(self.store), "Line": LineMap(self.store)}
+        """
+        self.data = {
+            "Node": {id: Node view with val (label), x, y}
+            "Line": {id: Line view with node1, node2, weight}
+        }
+        """
+        # Largest integer label given so far
+        self.curId = -1
+        # (store, curId) snapshots; commit() after every edit to undo it
+        self.history = []
+        self.historyIdx = -1
+        self.bus = EventBus()
+
+    def subscribe(self, listener, *eventTypes):
+        """
+        Call listener(event) after the changes of the types (all if none)
+        """
+        self.bus.subscribe(listener, *eventTypes)
+
+    def unsubscribe(self, listener):
+        self.bus.unsubscribe(listener)
+
+    @contextmanager
+    def batch(self):
+        """
+        Mark the changes made inside as a single edit
+        """
+        self.bus.publish(BatchBegin())
+        try:
+            yield
+        finally:
+            self.bus.publish(BatchEnd())
+
+    def nextLabel(self):
+        self.curId += 1
+        return self.curId
+
+    def addNode(self, label=None, x=0, y=0):
+        """
+        Id of a new node, labelled with the next integer unless given
+        """
+        if label is None:
+            label = self.nextLabel()
+        tag = self.store.addNode(label, x, y)
+        self.bus.publish(NodeAdded(tag))
+        return tag
+
+    def canConnect(self, node1, node2):
+        """
+        Edges of the editor are directed, without self-loops or repeats
+        """
+        return node1 != node2 and self.store.findEdge(node1, node2) is None
+
+    def addLine(self, node1, node2, weight=1):
+        """
+        Id of a new edge between the nodes of ids node1 and node2
+        """
+        tag = self.store.addEdge(node1, node2, weight)
+        self.bus.publish(EdgeAdded(tag))
+        return tag
+
+    def removeNode(self, tag):
+        """
+        Remove the node and its edges
+        """
+        store = self.store
+        store.checkNode(tag)
+        with self.batch():
+            for lineTag in set(store.incident(tag)):
+                self.removeLine(lineTag)
+            x, y = store.x[tag], store.y[tag]
+            store.removeNode(tag)
+            self.bus.publish(NodeRemoved(tag, x, y))
+
+    def removeLine(self, tag):
+        store = self.store
+        store.checkEdge(tag)
+        node1, node2 = store.source[tag], store.target[tag]
+        store.removeEdge(tag)
+        self.bus.publish(EdgeRemoved(tag, store.x[node1], store.y[node1],
+                                     store.x[node2], store.y[node2]))
+
+    def moveNode(self, tag, x, y):
+        store = self.store
+        store.checkNode(tag)
+        oldX, oldY = store.x[tag], store.y[tag]
+        store.moveNode(tag, x, y)
+        self.bus.publish(NodeMoved(tag, oldX, oldY))
+
+    def setWeight(self, tag, weight):
+        self.store.setWeight(tag, weight)
+        self.bus.publish(EdgeReweighted(tag))
+
+    def setLabel(self, tag, label):
+        self.store.setLabel(tag, label)
+        self.bus.publish(NodeRelabeled(tag))
+
+    def resetLabels(self):
+        """
+        Label the nodes 0, 1, 2... again
+        """
+        self.curId = -1
+        with self.batch():
+            for tag in list(self.store.nodeIds()):
+                self.setLabel(tag, self.nextLabel())
+
+    def layoutStep(self, layout, holding=None):
+        """
+        One step of a layout (see Graph.layout); return 1 once at rest
+        """
+        signal = layout.step(self.store, holding)
+        self.bus.publish(LayoutStepped())
+        return signal
+
+    def stopMotion(self):
+        self.store.stopMotion()
+
+    def commit(self):
+        self.historyIdx += 1
+        if len(self.history) == self.historyIdx:
+            self.history.append(None)
+        # Copying the columns of the store is all a snapshot takes
+        self.history[self.historyIdx] = (self.store.copy(), self.curId)
+
+    def undo(self):
+        """
+        Go back to the previous snapshot; False if there is none
+        """
+        if self.historyIdx:
+            self.historyIdx -= 1
+            self.load(*self.history[self.historyIdx])
+            return True
+        return False
+
+    def redo(self):
+        if len(self.history) - 1 > self.historyIdx:
+            self.historyIdx += 1
+            self.load(*self.history[self.historyIdx])
+            return True
+        return False
+
+    def load(self, store, curId):
+        """
+        Replace the graph by a copy of store, leaving the history as it is
+        """
+        self.store = store.copy()
+        self.data = {"Node": NodeMap(self.store), "Line": LineMap(self.store)}
+        self.curId = curId
+        self.bus.publish(GraphLoaded())
+
+    def loadRecords(self, nodes, edges, nodeSize=20):
+        """
+        Replace the graph by node and edge records (see Graph.fileio).
+        Nodes without a position are placed on a circle.
+        """
+        store = GraphStore()
+        curId = -1
+        for label, (x, y) in placeNodes(nodes, nodeSize).items():
+            store.addNode(label, x, y)
+            if isinstance(label, int):
+                curId = max(curId, label)
+        for label1, label2, weight in edges:
+            store.addEdge(store.findNode(label1), store.findNode(label2),
+                          weight)
+        self.load(store, curId)
+
+    def nodeRecords(self):
+        """
+        (label, x, y) of every node
+        """
+        store = self.store
+        for tag in store.nodeIds():
+            yield store.labels[tag], store.x[tag], store.y[tag]
+
+    def edgeRecords(self):
+        """
+        (label1, label2, weight) of every edge
+        """
+        store = self.store
+        for tag in store.edgeIds():
+            yield store.labels[store.source[tag]], \
+                store.labels[store.target[tag]], store.weights[tag]
+
+    def read(self, file, ext, nodeSize=20):
+        """
+        Load a binary graph file of the format of extension ext, maybe
+        compressed; unknown extensions are read as .gmg
+        """
+        self.loadRecords(*readGraphFile(file, ext), nodeSize)
+
+    def write(self, file, ext, codec="none"):
+        """
+        Save the graph to a binary file in the format of extension ext
+        """
+        writer = GRAPHFORMATS.get(ext, GRAPHFORMATS[".gmg"])[1]
+        with openWriter(file, codec) as stream:
+            writer(stream, self.nodeRecords(), self.edgeRecords())
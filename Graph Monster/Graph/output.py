@@ -0,0 +1,113 @@
+"""
+Text outputs of a graph: the Python lists, one element per line, and the
+customized output whose style is set in the Output Customizer.
+
+An output is made of units, the text of one node or edge, put together by
+a frame (left, separator, right); a view can then rewrite the unit of a
+single element without building the whole text again. Customized units are
+compiled once into str.format templates, so each unit is formatted in a
+single pass and a label is never taken for a token.
+"""
+import re
+
+
+DEFAULTOUTPUTSTYLE = {
+    "Node": {
+        "unit": "label",
+        "list": ["[", "]"],
+        "sep": ", "
+    },
+    "Line": {
+        "unit": "(node1, node2, weight)",
+        "list": ["[", "]"],
+        "sep": ", "
+    },
+}
+LISTFRAME = ("[", ", ", "]")
+LINEFRAME = ("", "\n", "")
+
+
+def listNodeUnit(node):
+    return repr(node.val)
+
+
+def listLineUnit(line):
+    return repr(line.getView())
+
+
+def lineNodeUnit(node):
+    return str(node)
+
+
+def lineLineUnit(line):
+    return " ".join(map(str, line.getView()))
+
+
+def compileTemplate(unit, tokens):
+    """
+    str.format template of a customized unit: the tokens become fields of
+    the same name, the rest is kept as is
+    """
+    pattern = "|".join(map(re.escape, sorted(tokens, key=len, reverse=True)))
+    parts = re.split(f"({pattern})", unit)
+    # The odd parts are the tokens
+    return "".join(
+        "{%s}" % part if i % 2 else part.replace("{", "{{").replace("}", "}}")
+        for i, part in enumerate(parts))
+
+
+def customNodeUnit(unit):
+    fmt = compileTemplate(unit, ("label", )).format
+    return lambda node: fmt(label=node)
+
+
+def customLineUnit(unit):
+    fmt = compileTemplate(unit, ("node1", "node2", "weight")).format
+    return lambda line: fmt(node1=line.node1,
+                            node2=line.node2,
+                            weight=line.weight)
+
+
+def checkCustomedStyle(style, modeN, modeL):
+    '''
+    mode = 0: line mode
+    mode = 1: list mode
+    '''
+    nodeU, nodeL, nodeS = style["Node"].values()
+    lineU, lineL, lineS = style["Line"].values()
+    return (not modeN or (all(nodeL) and nodeS)) and \
+            (not modeL or (all(lineL) and lineS))
+
+
+def outputFormats(style, modeN, modeL):
+    '''
+    ((node unit, frame), (edge unit, frame)) of the list, line and
+    customized outputs; built once per style
+        mode = 0: line mode
+        mode = 1: list mode
+    '''
+    nodeU, nodeL, nodeS = style["Node"].values()
+    lineU, lineL, lineS = style["Line"].values()
+    return (
+        ((listNodeUnit, LISTFRAME), (listLineUnit, LISTFRAME)),
+        ((lineNodeUnit, LINEFRAME), (lineLineUnit, LINEFRAME)),
+        (
+            (customNodeUnit(nodeU),
+             (nodeL[0], nodeS, nodeL[1]) if modeN else LINEFRAME),
+            (customLineUnit(lineU),
+             (lineL[0], lineS, lineL[1]) if modeL else LINEFRAME),
+        ),
+    )
+
+
+def writeOutput(stream, views, unit, frame):
+    """
+    Write an output to a text stream one unit at a time
+    """
+    left, sep, right = frame
+    stream.write(left)
+    for i, view in enumerate(views):
+        if i:
+            stream.write(sep)
+        stream.write(unit(view))
+    stream.write(right)
@@ -0,0 +1,231 @@
+"""
+Pictures of a graph without a display.
+
+SVG is streamed element by element; PNG is rasterized with Pillow when it
+is installed, at most PNGMAXSIZE pixels on its longer side. Graphs come in
+as the records of Graph.fileio; only the nodes are held, the edges are
+drawn as they are read. So a graph file of any size can be drawn on a
+server:
+    python -m Graph.render graph.graphml picture.svg --theme 0
+"""
+from argparse import ArgumentParser
+from functools import lru_cache
+from math import hypot
+from os.path import splitext
+from xml.sax.saxutils import escape
+from .fileio import GRAPHFORMATS, streamGraphFile
+from .layout import placeNodes
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PNGSUPPORT = True
+except ImportError:
+    PNGSUPPORT = False
+
+THEMENAME = ("minty", "darkly", "solar", "cyborg")
+COLORBOOK = {
+    "oval": ("#E4E4E4", "grey", "#3f98d7", "#555555"),
+    "line": ("#17A2B8", "#FF7851", "#d95092", "#77b300"),
+    "text": ("black", "#32fbe2", "white", "white"),
+}
+'''
+{type: (color of each theme, )}
+'''
+DEFAULTSTYLE = {
+    "nodeSize": 20,
+    "nodeWidth": 2,
+    "lineWidth": 3,
+    "labelOffset": 10,
+    "fontSize": 13,
+    "margin": 40,
+}
+# The image of a PNG picture takes 4 bytes per pixel
+PNGMAXSIZE = 4096
+
+
+@lru_cache()
+def loadFont(size):
+    for name in ("DejaVuSans-Bold.ttf", "arialbd.ttf", "Arial Bold.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+def arrowHead(x1, y1, x2, y2, width):
+    """
+    Polygon of a Tk style arrow head ("-arrowshape {8 10 3}") at (x2, y2)
+    """
+    length = hypot(x2 - x1, y2 - y1) or 1
+    ux, uy = (x2 - x1) / length, (y2 - y1) / length
+    wing = 3 + width / 2
+    return [
+        (x2, y2),
+        (x2 - 10 * ux - wing * uy, y2 - 10 * uy + wing * ux),
+        (x2 - 8 * ux, y2 - 8 * uy),
+        (x2 - 10 * ux + wing * uy, y2 - 10 * uy - wing * ux),
+    ]
+
+
+def themeColors(theme):
+    return {thisType: colors[theme] for thisType, colors in COLORBOOK.items()}
+
+
+def edgeCoords(x1, y1, x2, y2, r):
+    """
+    Edge between two centers, cut at both circles of radius r
+    """
+    length = hypot(x2 - x1, y2 - y1) or 1
+    dx, dy = (x2 - x1) / length * r, (y2 - y1) / length * r
+    return x1 + dx, y1 + dy, x2 - dx, y2 - dy
+
+
+def weightPosition(x1, y1, x2, y2, offset, ratio=0.7):
+    return (
+        x1 * ratio + x2 * (1 - ratio) + offset,
+        y1 * ratio + y2 * (1 - ratio) + offset,
+    )
+
+
+def getBounds(positions, style):
+    if not positions:
+        return 0, 0, 1, 1
+    pad = style["nodeSize"] + style["margin"]
+    xs = [x for x, _ in positions.values()]
+    ys = [y for _, y in positions.values()]
+    return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+
+def iterEdges(positions, edges, style):
+    """
+    (edge coordinates, weight position, weight) of the drawable edges
+    """
+    for label1, label2, weight in edges:
+        if label1 in positions and label2 in positions:
+            coords = edgeCoords(*positions[label1], *positions[label2],
+                                style["nodeSize"])
+            yield coords, weightPosition(*coords, style["labelOffset"]), weight
+
+
+def writeSVG(file, nodes, edges, colors, style=DEFAULTSTYLE):
+    """
+    Stream an SVG picture of the graph to the binary file.
+    Only the node positions are held; every edge is written as it comes.
+    """
+    write = lambda text: file.write(text.encode("utf-8"))
+    positions = placeNodes(nodes, style["nodeSize"])
+    x1, y1, x2, y2 = getBounds(positions, style)
+    wing = 3 + style["lineWidth"] / 2
+    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<svg xmlns="http://www.w3.org/2000/svg" '
+          f'width="{x2 - x1:.0f}" height="{y2 - y1:.0f}" '
+          f'viewBox="{x1:.2f} {y1:.2f} {x2 - x1:.2f} {y2 - y1:.2f}">\n'
+          '<defs>\n'
+          '<marker id="arrow" orient="auto" markerUnits="userSpaceOnUse" '
+          f'overflow="visible"><path d="M0,0 L-10,{wing} L-8,0 L-10,{-wing} Z" '
+          f'fill="{escape(colors["line"])}"/></marker>\n'
+          '<style>\n'
+          f'line {{stroke: {colors["line"]}; stroke-width: {style["lineWidth"]}; '
+          'marker-end: url(#arrow)}\n'
+          f'circle {{fill: {colors["oval"]}; stroke: black; '
+          f'stroke-width: {style["nodeWidth"]}}}\n'
+          f'text {{fill: {colors["text"]}; font-size: {style["fontSize"]}px; '
+          'font-weight: bold; text-anchor: middle; '
+          'dominant-baseline: central}\n'
+          '</style>\n'
+          '</defs>\n')
+    for (ex1, ey1, ex2, ey2), (tx, ty), weight in iterEdges(
+            positions, edges, style):
+        write(f'<line x1="{ex1:.2f}" y1="{ey1:.2f}" '
+              f'x2="{ex2:.2f}" y2="{ey2:.2f}"/>'
+              f'<text x="{tx:.2f}" y="{ty:.2f}">{escape(str(weight))}</text>\n')
+    r = style["nodeSize"]
+    for label, (x, y) in positions.items():
+        write(f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{r}"/>'
+              f'<text x="{x:.2f}" y="{y:.2f}">{escape(str(label))}</text>\n')
+    write('</svg>\n')
+
+
+def writePNG(file, nodes, edges, colors, style=DEFAULTSTYLE, scale=1,
+             maxSize=PNGMAXSIZE):
+    """
+    Rasterize the graph into a PNG written to the binary file.
+    The picture is scaled down to fit maxSize pixels on its longer side.
+    """
+    positions = placeNodes(nodes, style["nodeSize"])
+    x1, y1, x2, y2 = getBounds(positions, style)
+    scale = min(scale, maxSize / max(x2 - x1, y2 - y1))
+    image = Image.new("RGBA",
+                      (max(1, round((x2 - x1) * scale)),
+                       max(1, round((y2 - y1) * scale))),
+                      (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    font = loadFont(max(1, round(style["fontSize"] * scale)))
+    toImage = lambda x, y: ((x - x1) * scale, (y - y1) * scale)
+    width = max(1, round(style["lineWidth"] * scale))
+    for coords, weightAt, weight in iterEdges(positions, edges, style):
+        ex1, ey1, ex2, ey2 = *toImage(*coords[:2]), *toImage(*coords[2:])
+        draw.line((ex1, ey1, ex2, ey2), fill=colors["line"], width=width)
+        draw.polygon(arrowHead(ex1, ey1, ex2, ey2, width), fill=colors["line"])
+        draw.text(toImage(*weightAt), str(weight), fill=colors["text"],
+                  font=font, anchor="mm")
+    r = style["nodeSize"] * scale
+    for label, (x, y) in positions.items():
+        x, y = toImage(x, y)
+        draw.ellipse((x - r, y - r, x + r, y + r),
+                     fill=colors["oval"],
+                     outline="black",
+                     width=max(1, round(style["nodeWidth"] * scale)))
+        draw.text((x, y), str(label), fill=colors["text"], font=font,
+                  anchor="mm")
+    image.save(file, "PNG")
+
+
+PICTUREFORMATS = {
+    ".svg": writeSVG,
+    ".png": writePNG,
+}
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        description="Draw a Graph Monster graph as an SVG or PNG picture.")
+    parser.add_argument("graph",
+                        help="graph file: " + ", ".join(GRAPHFORMATS))
+    parser.add_argument("picture",
+                        help="picture file: " + ", ".join(PICTUREFORMATS))
+    parser.add_argument("--theme",
+                        type=int,
+                        default=1,
+                        choices=range(len(THEMENAME)),
+                        help="colors of the theme: " + ", ".join(
+                            f"{i} {name}" for i, name in enumerate(THEMENAME)))
+    parser.add_argument("--scale",
+                        type=float,
+                        default=1,
+                        help="pixels per unit of a PNG picture")
+    parser.add_argument("--size",
+                        type=int,
+                        default=PNGMAXSIZE,
+                        help="most pixels on the longer side of a PNG picture")
+    args = parser.parse_args(argv)
+    ext = splitext(args.graph)[1].lower()
+    if ext not in GRAPHFORMATS:
+        parser.error(f"unknown graph format {ext}")
+    writer = PICTUREFORMATS.get(splitext(args.picture)[1].lower())
+    if writer is None:
+        parser.error("the picture must be a .svg or .png file")
+    if writer is writePNG and not PNGSUPPORT:
+        parser.error("PNG pictures need Pillow")
+    nodes, edges = streamGraphFile(args.graph, ext)
+    with open(args.picture, "wb") as file:
+        if writer is writePNG:
+            writePNG(file, nodes, edges, themeColors(args.theme),
+                     scale=args.scale, maxSize=args.size)
+        else:
+            writeSVG(file, nodes, edges, themeColors(args.theme))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Uniform grid index over the geometry of a graph, so that the items around
+a region can be found without looking at every node and edge.
+"""
+from collections import defaultdict
+from math import hypot, inf
+
+
+class SpatialGrid:
+
+    def __init__(self, cellSize=256):
+        self.cellSize = cellSize
+        self.cells = defaultdict(set)
+        self.keyCells = {}
+
+    def cellOf(self, x, y):
+        return int(x // self.cellSize), int(y // self.cellSize)
+
+    def insertPoint(self, key, x, y):
+        self.remove(key)
+        cell = self.cellOf(x, y)
+        self.cells[cell].add(key)
+        self.keyCells[key] = (cell, )
+
+    def insertSegment(self, key, x1, y1, x2, y2):
+        """
+        Register the key in every cell the segment passes through
+        """
+        self.remove(key)
+        cells = set(self.segmentCells(x1, y1, x2, y2))
+        for cell in cells:
+            self.cells[cell].add(key)
+        self.keyCells[key] = tuple(cells)
+
+    def segmentCells(self, x1, y1, x2, y2):
+        """
+        Cells crossed by the segment, walked from cell to cell along it
+        (Amanatides and Woo); both neighbours are taken where it goes
+        through a corner
+        """
+        size = self.cellSize
+        i, j = self.cellOf(x1, y1)
+        iEnd, jEnd = self.cellOf(x2, y2)
+        dx, dy = x2 - x1, y2 - y1
+        stepI, stepJ = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        # Fractions of the segment at which it crosses the next vertical
+        # and horizontal lines of the grid, and between two such lines
+        if dx:
+            tMaxX = ((i + (dx > 0)) * size - x1) / dx
+            tDeltaX = size / abs(dx)
+        else:
+            tMaxX = tDeltaX = inf
+        if dy:
+            tMaxY = ((j + (dy > 0)) * size - y1) / dy
+            tDeltaY = size / abs(dy)
+        else:
+            tMaxY = tDeltaY = inf
+        cells = [(i, j)]
+        for _ in range(abs(iEnd - i) + abs(jEnd - j)):
+            if (i, j) == (iEnd, jEnd):
+                break
+            if tMaxX < tMaxY:
+                i += stepI
+                tMaxX += tDeltaX
+            elif tMaxY < tMaxX:
+                j += stepJ
+                tMaxY += tDeltaY
+            else:
+                cells += [(i + stepI, j), (i, j + stepJ)]
+                i += stepI
+                j += stepJ
+                tMaxX += tDeltaX
+                tMaxY += tDeltaY
+            cells.append((i, j))
+        # Rounding can not lose the last cell
+        cells.append((iEnd, jEnd))
+        return cells
+
+    def remove(self, key):
+        for cell in self.keyCells.pop(key, ()):
+            bucket = self.cells[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.cells[cell]
+
+    def query(self, x1, y1, x2, y2):
+        """
+        Keys registered in the cells covering the rectangle
+        """
+        (i1, j1), (i2, j2) = self.cellOf(x1, y1), self.cellOf(x2, y2)
+        found = set()
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > len(self.cells):
+            for (i, j), bucket in self.cells.items():
+                if i1 <= i <= i2 and j1 <= j <= j2:
+                    found |= bucket
+        else:
+            for i in range(i1, i2 + 1):
+                for j in range(j1, j2 + 1):
+                    if (i, j) in self.cells:
+                        found |= self.cells[i, j]
+        return found
+
+    def nearest(self, x, y, radius, distance):
+        """
+        Key closest to (x, y) by distance(key) among those within radius,
+        None if there is none
+        """
+        best, bestDistance = None, radius
+        for key in self.query(x - radius, y - radius, x + radius, y + radius):
+            if (d := distance(key)) <= bestDistance:
+                best, bestDistance = key, d
+        return best
+
+    def clear(self):
+        self.cells.clear()
+        self.keyCells.clear()
+
+
+def segmentDistance(x, y, x1, y1, x2, y2):
+    """
+    Distance from the point (x, y) to the segment (x1, y1)-(x2, y2)
+    """
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / length)) if length else 0
+    return hypot(x - x1 - t * dx, y - y1 - t * dy)
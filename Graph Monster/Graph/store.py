@@ -0,0 +1,395 @@
+"""
+Array-backed storage of a graph.
+
+Nodes and edges get integer ids in the order they are added, so listing
+them by id keeps that order; the id of a deleted element is never given
+again. Ids do not depend on labels or on canvas items and survive copies,
+so the history keeps them. Editing a missing or deleted id raises
+KeyError. Node labels, positions, velocities and
+accelerations are kept in columns, edges in parallel source / target /
+weight columns. Which edges touch a node is answered by a CSR structure
+(offsets into an array of edge ids), rebuilt lazily after the topology
+changed; the edges from one node to another by a hash index kept up to
+date on every edit, and the nodes carrying a label by a label index.
+Node and Line are light slotted views over a store, keeping the attribute
+access of the old objects; a view is two references, so they are made on
+demand and never copied into the history.
+"""
+from array import array
+from collections.abc import Mapping
+
+
+class GraphStore:
+
+    def __init__(self):
+        # None marks a free node id
+        self.labels = []
+        self.x = array("d")
+        self.y = array("d")
+        self.vx = array("d")
+        self.vy = array("d")
+        self.ax = array("d")
+        self.ay = array("d")
+        # {label: (node ids, )}
+        self.labelIndex = {}
+        # -1 marks a free edge id
+        self.source = array("l")
+        self.target = array("l")
+        self.weights = []
+        # {(source, target): (edge ids, )}, tuples so copies can share them
+        self.edgeIndex = {}
+        self.nodeCount = 0
+        self.edgeCount = 0
+        # Bumped on every change of the topology
+        self.version = 0
+        self.csr = None
+        self.csrVersion = -1
+        self.neighborBook = None
+        self.neighborVersion = -1
+
+    def copy(self):
+        other = GraphStore.__new__(GraphStore)
+        for name in ("x", "y", "vx", "vy", "ax", "ay", "source", "target"):
+            setattr(other, name, array(getattr(self, name).typecode,
+                                       getattr(self, name)))
+        other.labels = self.labels[:]
+        other.weights = self.weights[:]
+        other.labelIndex = dict(self.labelIndex)
+        other.edgeIndex = dict(self.edgeIndex)
+        other.nodeCount = self.nodeCount
+        other.edgeCount = self.edgeCount
+        other.version = self.version
+        # The CSR arrays are never changed in place, so they can be shared
+        other.csr = self.csr
+        other.csrVersion = self.csrVersion
+        other.neighborBook = self.neighborBook
+        other.neighborVersion = self.neighborVersion
+        return other
+
+    def addNode(self, label, x=0, y=0):
+        tag = len(self.labels)
+        self.labels.append(label)
+        self.x.append(x)
+        self.y.append(y)
+        for column in (self.vx, self.vy, self.ax, self.ay):
+            column.append(0)
+        self.indexLabel(label, tag)
+        self.nodeCount += 1
+        self.version += 1
+        return tag
+
+    def removeNode(self, tag):
+        """
+        Remove the node and the edges touching it
+        """
+        self.checkNode(tag)
+        # A self-loop is listed twice
+        for edge in set(self.incident(tag)):
+            self.removeEdge(edge)
+        self.unindexLabel(self.labels[tag], tag)
+        self.labels[tag] = None
+        self.nodeCount -= 1
+        self.version += 1
+
+    def indexLabel(self, label, tag):
+        self.labelIndex[label] = self.labelIndex.get(label, ()) + (tag,)
+
+    def unindexLabel(self, label, tag):
+        tags = tuple(x for x in self.labelIndex[label] if x != tag)
+        if tags:
+            self.labelIndex[label] = tags
+        else:
+            del self.labelIndex[label]
+
+    def setLabel(self, tag, label):
+        self.checkNode(tag)
+        self.unindexLabel(self.labels[tag], tag)
+        self.labels[tag] = label
+        self.indexLabel(label, tag)
+
+    def findNodes(self, label):
+        """
+        Ids of the nodes labelled label
+        """
+        return self.labelIndex.get(label, ())
+
+    def findNode(self, label):
+        """
+        Id of a node labelled label, None if there is none
+        """
+        tags = self.labelIndex.get(label)
+        return tags[0] if tags else None
+
+    def moveNode(self, tag, x, y):
+        self.checkNode(tag)
+        self.x[tag], self.y[tag] = x, y
+
+    def addEdge(self, node1, node2, weight=1):
+        self.checkNode(node1)
+        self.checkNode(node2)
+        tag = len(self.weights)
+        self.source.append(node1)
+        self.target.append(node2)
+        self.weights.append(weight)
+        key = (node1, node2)
+        self.edgeIndex[key] = self.edgeIndex.get(key, ()) + (tag,)
+        self.edgeCount += 1
+        self.version += 1
+        return tag
+
+    def setWeight(self, tag, weight):
+        self.checkEdge(tag)
+        self.weights[tag] = weight
+
+    def removeEdge(self, tag):
+        self.checkEdge(tag)
+        key = (self.source[tag], self.target[tag])
+        edges = tuple(x for x in self.edgeIndex[key] if x != tag)
+        if edges:
+            self.edgeIndex[key] = edges
+        else:
+            del self.edgeIndex[key]
+        self.source[tag] = self.target[tag] = -1
+        self.weights[tag] = None
+        self.edgeCount -= 1
+        self.version += 1
+
+    def hasNode(self, tag):
+        return isinstance(tag, int) and 0 <= tag < len(self.labels) and \
+            self.labels[tag] is not None
+
+    def hasEdge(self, tag):
+        return isinstance(tag, int) and 0 <= tag < len(self.source) and \
+            self.source[tag] != -1
+
+    def checkNode(self, tag):
+        if not self.hasNode(tag):
+            raise KeyError(tag)
+
+    def checkEdge(self, tag):
+        if not self.hasEdge(tag):
+            raise KeyError(tag)
+
+    def findEdges(self, node1, node2):
+        """
+        Ids of the edges from node1 to node2
+        """
+        return self.edgeIndex.get((node1, node2), ())
+
+    def findEdge(self, node1, node2):
+        """
+        Id of an edge from node1 to node2, None if there is none
+        """
+        edges = self.edgeIndex.get((node1, node2))
+        return edges[0] if edges else None
+
+    def nodeIds(self):
+        return (tag for tag, label in enumerate(self.labels) if label is not None)
+
+    def edgeIds(self):
+        return (tag for tag, source in enumerate(self.source) if source != -1)
+
+    def getCSR(self):
+        """
+        (offsets, edge ids): the edges touching node i, in either direction,
+        are edgeIds[offsets[i]:offsets[i + 1]]
+        """
+        if self.csrVersion != self.version:
+            n = len(self.labels)
+            offsets = array("l", [0]) * (n + 1)
+            for column in (self.source, self.target):
+                for node in column:
+                    if node != -1:
+                        offsets[node + 1] += 1
+            for i in range(n):
+                offsets[i + 1] += offsets[i]
+            fill = offsets[:-1]
+            edgeIds = array("l", [0]) * offsets[n]
+            for edge, (node1, node2) in enumerate(zip(self.source, self.target)):
+                if node1 != -1:
+                    edgeIds[fill[node1]] = edge
+                    fill[node1] += 1
+                    edgeIds[fill[node2]] = edge
+                    fill[node2] += 1
+            self.csr = (offsets, edgeIds)
+            self.csrVersion = self.version
+        return self.csr
+
+    def incident(self, tag):
+        """
+        Ids of the edges touching the node
+        """
+        offsets, edgeIds = self.getCSR()
+        return edgeIds[offsets[tag]:offsets[tag + 1]]
+
+    def degree(self, tag):
+        offsets, _ = self.getCSR()
+        return offsets[tag + 1] - offsets[tag]
+
+    def getNeighbors(self):
+        """
+        Frozensets of the ids of the nodes sharing an edge with node i, by i;
+        rebuilt lazily like the CSR
+        """
+        if self.neighborVersion != self.version:
+            offsets, edgeIds = self.getCSR()
+            source, target = self.source, self.target
+            self.neighborBook = [
+                frozenset(
+                    target[edge] if source[edge] == tag else source[edge]
+                    for edge in edgeIds[offsets[tag]:offsets[tag + 1]])
+                for tag in range(len(self.labels))
+            ]
+            self.neighborVersion = self.version
+        return self.neighborBook
+
+    def neighbors(self, tag):
+        """
+        Ids of the nodes sharing an edge with the node
+        """
+        return self.getNeighbors()[tag]
+
+    def stopMotion(self):
+        for column in (self.vx, self.vy, self.ax, self.ay):
+            column[:] = array("d", [0]) * len(column)
+
+
+class Node:
+    """
+    View of a node of a GraphStore
+    """
+    __slots__ = ("store", "tag")
+
+    def __init__(self, store, tag):
+        self.store = store
+        self.tag = tag
+
+    @property
+    def val(self):
+        return self.store.labels[self.tag]
+
+    @val.setter
+    def val(self, label):
+        self.store.setLabel(self.tag, label)
+
+    @property
+    def x(self):
+        return self.store.x[self.tag]
+
+    @x.setter
+    def x(self, x):
+        self.store.x[self.tag] = x
+
+    @property
+    def y(self):
+        return self.store.y[self.tag]
+
+    @y.setter
+    def y(self, y):
+        self.store.y[self.tag] = y
+
+    @property
+    def v(self):
+        return self.store.vx[self.tag], self.store.vy[self.tag]
+
+    @property
+    def a(self):
+        return self.store.ax[self.tag], self.store.ay[self.tag]
+
+    @property
+    def adjLines(self):
+        return self.store.incident(self.tag)
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.tag == other.tag
+
+    def __hash__(self):
+        return hash(self.tag)
+
+    def __str__(self):
+        return str(self.val)
+
+
+class Line:
+    """
+    View of an edge of a GraphStore
+    """
+    __slots__ = ("store", "tag")
+
+    def __init__(self, store, tag):
+        self.store = store
+        self.tag = tag
+
+    @property
+    def node1(self):
+        return Node(self.store, self.store.source[self.tag])
+
+    @property
+    def node2(self):
+        return Node(self.store, self.store.target[self.tag])
+
+    @property
+    def weight(self):
+        return self.store.weights[self.tag]
+
+    @weight.setter
+    def weight(self, weight):
+        self.store.weights[self.tag] = weight
+
+    def __eq__(self, other):
+        return isinstance(other, Line) and self.tag == other.tag
+
+    def __hash__(self):
+        return hash(self.tag)
+
+    def getView(self):
+        return (self.node1.val, self.node2.val, self.weight)
+
+    def __str__(self):
+        return str(self.getView())
+
+
+class NodeMap(Mapping):
+    """
+    {id: Node} of a GraphStore
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, tag):
+        if not self.store.hasNode(tag):
+            raise KeyError(tag)
+        return Node(self.store, tag)
+
+    def __contains__(self, tag):
+        return self.store.hasNode(tag)
+
+    def __iter__(self):
+        return self.store.nodeIds()
+
+    def __len__(self):
+        return self.store.nodeCount
+
+
+class LineMap(Mapping):
+    """
+    {id: Line} of a GraphStore
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, tag):
+        if not self.store.hasEdge(tag):
+            raise KeyError(tag)
+        return Line(self.store, tag)
+
+    def __contains__(self, tag):
+        return self.store.hasEdge(tag)
+
+    def __iter__(self):
+        return self.store.edgeIds()
+
+    def __len__(self):
+        return self.store.edgeCount
@@ -3,57 +3,49 @@ from ttkbootstrap import Window, Frame, Button, \
                         Canvas, Toplevel, Entry, \
                         StringVar, Menu, Style, \
                         IntVar, DoubleVar, Notebook, \
-                        Panedwindow, Checkbutton
+                        Panedwindow, Checkbutton, Scrollbar
 from tkinter.filedialog import askopenfile, asksaveasfile
 from ttkbootstrap.dialogs.dialogs import Messagebox
-from math import atan2, atan, cos, sin
-from pickle import dump, load
+from math import atan, cos, sin, hypot
 from functools import partial
 from copy import deepcopy
+from io import StringIO, TextIOWrapper
+from os.path import splitext, expanduser
+from Graph import Graph, ForceLayout, SpatialGrid
+from Graph.fileio import CODECS, parseWeight, readStyle, writeStyle
+from Graph.autosave import Autosaver, readJournal
+from Graph.spatial import segmentDistance
+from Graph.render import COLORBOOK, THEMENAME, PICTUREFORMATS, PNGSUPPORT
+from Graph.output import DEFAULTOUTPUTSTYLE, checkCustomedStyle, \
+                         outputFormats, writeOutput
+from Graph.events import NodeAdded, NodeMoved, NodeRelabeled, NodeRemoved, \
+                         EdgeAdded, EdgeReweighted, EdgeRemoved, \
+                         LayoutStepped, GraphLoaded
+from Graph_Tiles import TILESUPPORT, TileCache, renderTile, toPhotoImage
+from Graph_Panes import OutputPane
 import time
 
 
-class Node:
-
-    def __init__(self, val, canvasIds=[], scale=1):
-        self.val = val
-        # 2 elements: widget id and its label id
-        self.canvasIds = canvasIds if canvasIds else []
-        self.scale = scale
-        self.adjLines = set()
-        self.v = [0, 0]
-        self.a = [0, 0]
-
-    def __eq__(self, other):
-        return isinstance(other, Node) and self.val == other.val
-
-    def __str__(self):
-        return str(self.val)
-
-
-class Line:
-
-    def __init__(self, node1, node2, weight=1, canvasIds=[]):
-        if isinstance(node1, Node) and isinstance(node2, Node):
-            self.node1 = node1
-            self.node2 = node2
-            self.weight = weight
-            self.canvasIds = canvasIds
-        else:
-            raise TypeError("Error in Node type")
-
-    def __eq__(self, other):
-        return self.node1 == other.node1 and self.node2 == other.node2
-
-    def getView(self):
-        return (self.node1.val, self.node2.val, self.weight)
-
-    def __str__(self):
-        return str(self.getView())
+BULKPROCS = """
+proc gmBulkCreate {canvas type items options} {
+    set ids {}
+    foreach item $items {
+        lappend ids [$canvas create $type {*}$item {*}$options]
+    }
+    return $ids
+}
+proc gmBulkCoords {canvas items} {
+    foreach {id coords} $items {
+        $canvas coords $id {*}$coords
+    }
+}
+"""
 
 
 class GraphMonster:
     """
+    Tk editor of a Graph (see the Graph package); every edit goes through
+    the model, and the canvas follows the changes it reports.
     New features:
         1. It is able to track the graph now. You may use Ctrl-Z/Y to cancel/redo changes.
         2. The customized output style can be exported and imported now.
@@ -74,14 +66,18 @@ class GraphMonster:
         self.NODENEIGHBORTOLERANCE = 5
         self.EMPTY = -1e9
         self.OUTPUTSTYLES = (" List ", " Line ", "Customized Style")
-        self.THEMENAME = ("minty", "darkly", "solar", "cyborg")
-        self.COLORBOOK = {
-            "oval": ("#E4E4E4", "grey", "#3f98d7", "#555555"),
-            "line": ("#17A2B8", "#FF7851", "#d95092", "#77b300"),
-            "text": ("black", "#32fbe2", "white", "white"),
+        self.THEMENAME = THEMENAME
+        # {type: (color, )}, shared with the headless renderer
+        self.COLORBOOK = COLORBOOK
+        self.TAGTYPES = {
+            "node": "oval",
+            "cluster": "oval",
+            "line": "line",
+            "label": "text",
+            "weight": "text",
         }
         '''
-        {type: (color, )}
+        {tag given to canvas items at creation: type in COLORBOOK}
         '''
         self.LINETAGOFFSET = 10
         self.SCALERATIO = 1.3
@@ -89,7 +85,36 @@ class GraphMonster:
         self.NODESIZE = 20
         self.LINEWIDTH = 3
         self.CANVASUPDATEGAP = 1 / 120
+        self.VIEWMARGIN = 0.25
+        # Below each scale one more level of detail is dropped:
+        # edge weights, node labels, arrows, then nodes (drawn as clusters)
+        self.LODSCALES = (0.6, 0.4, 0.25, 0.12)
+        self.CLUSTERSIZE = 40
+        # Moves below it are not pushed to the canvas during reformatting
+        self.MOVEEPSILON = 0.1
+        self.FRAMEGAP = 16  # ms
+        # Share of the elements changed in a frame above which the outputs
+        # are rebuilt instead of patched
+        self.OUTPUTREBUILDRATIO = 0.25
+        # Outputs of more elements only format the lines in view
+        self.VIRTUALUNITS = 5000
+        # Room left around changed items for text drawn into tiles
+        self.TILEMARGIN = 64  # px
+        self.GRAPHFILETYPES = (
+            ("Graph Monster Graph", "*.gmg"),
+            ("GraphML", "*.graphml"),
+            ("GEXF", "*.gexf"),
+            ("Edge List", "*.txt *.edges"),
+        )
+        self.PICTUREFILETYPES = (
+            ("SVG Picture", "*.svg"),
+            ("PNG Picture", "*.png"),
+        )
+        self.AUTOSAVEPATH = expanduser("~/.graph_monster_autosave.gmj")
+        self.AUTOSAVEEDITS = 20
+        self.AUTOSAVEGAP = 30000  # ms
         self.curTheme = IntVar(value=1)
+        self.themeColors = {}
         self.damping = DoubleVar(value=.1)
         self.nodeMass = IntVar(value=15)
         self.elasticity = DoubleVar(value=1)
@@ -100,26 +125,21 @@ class GraphMonster:
         self.repelThreshold = DoubleVar(value=200.0)
         self.formatStatus = StringVar(value="Ready")
         self.reformatState = StringVar(value="Activate")
+        self.compression = StringVar(value="none")
+        self.tileMode = IntVar(value=0)
+        # canvas = world * curScale + viewOffset
         self.curScale = 1
-        self.incre_idx = -1
+        self.viewOffset = (0, 0)
         self.startNode = self.EMPTY
-        self.motionTolerance = 1e-4
         self.lineStartNode = self.EMPTY
-        self.graphHistory = []
-        self.historyIdx = -1
-        self.defaultOutputStyle = {
-            "Node": {
-                "unit": "label",
-                "list": ["[", "]"],
-                "sep": ", "
-            },
-            "Line": {
-                "unit": "(node1, node2, weight)",
-                "list": ["[", "]"],
-                "sep": ", "
-            },
-        }
+        self.unsavedEdits = 0
+        self.autosaver = Autosaver(self.AUTOSAVEPATH)
+        self.defaultOutputStyle = DEFAULTOUTPUTSTYLE
         self.curOutputStyle = deepcopy(self.defaultOutputStyle)
+        # Units and frames of the outputs, compiled from the style
+        self.curOutputFormats = outputFormats(self.curOutputStyle,
+                                              self.customNodeMode.get(),
+                                              self.customLineMode.get())
         self.ouputData = {
             "Node": [
                 StringVar(value="label"),
@@ -134,29 +154,71 @@ class GraphMonster:
                 StringVar(value=", ")
             ],
         }
-        self.data = {"Node": {}, "Line": {}}
-        """
-        self.data = {
-            "Node": {
-                tag: Node(Label, [canvasIds], scale)\n
-                the node centered at ((x1 + x2) / 2, (y1 + y2) / 2)
-                has the label "Label" and has been scaled by "scale"
-            }
-            "Line": {
-                tag: Line(Node_1, Node_2, weight=1, [canvasIds])\n
-                the edge from "node_1" to "node_2" has weight "weight"
-            }
-        }
-        """
+        # Node positions are in world coordinates.
+        # Only the items around the visible region exist on the canvas.
+        self.model = Graph()
+        self.model.subscribe(self.onNodeAdded, NodeAdded)
+        self.model.subscribe(self.onNodeMoved, NodeMoved)
+        self.model.subscribe(self.onNodeRelabeled, NodeRelabeled)
+        self.model.subscribe(self.onNodeRemoved, NodeRemoved)
+        self.model.subscribe(self.onEdgeAdded, EdgeAdded)
+        self.model.subscribe(self.onEdgeReweighted, EdgeReweighted)
+        self.model.subscribe(self.onEdgeRemoved, EdgeRemoved)
+        self.model.subscribe(self.onLayoutStepped, LayoutStepped)
+        self.model.subscribe(self.onGraphLoaded, GraphLoaded)
+        # The outputs catch up once per frame
+        self.model.subscribe(self.noteOutputChange, NodeAdded, NodeRelabeled,
+                             NodeRemoved, EdgeAdded, EdgeReweighted,
+                             EdgeRemoved, GraphLoaded)
+        self.framePending = False
+        # Ids of the nodes and edges whose output changed during the frame
+        self.dirtyNodes = set()
+        self.dirtyLines = set()
+        self.outputStale = False
+        # id: [widget id, label id] of the nodes and edges on the canvas
+        self.nodeItems = {}
+        self.lineItems = {}
+        self.shownNodes = set()
+        self.shownLines = set()
+        self.nodeGrid = SpatialGrid()
+        self.lineGrid = SpatialGrid()
+        # tag: node center last pushed to the canvas and nodeGrid
+        self.syncedPos = {}
+        self.refreshPending = False
+        # the zoom changed and the items on the canvas are not reprojected yet
+        self.viewChanged = False
+        self.lodTier = 0
+        # latest pointer position not handled yet, and the assist line
+        self.pendingMotion = None
+        self.assistLine = None
+        # Raster tiles: key: (canvas id, image) of the tiles on the canvas,
+        # and the ("Node"/"Line", id) under the pointer, kept as canvas items
+        self.tileCache = TileCache()
+        self.shownTiles = {}
+        self.hoverItem = (None, None)
 
         menubar = Menu(self.mainWin)
         menu = Menu(menubar, tearoff=0)
         menu2 = Menu(menubar, tearoff=0)
+        menu3 = Menu(menu, tearoff=0)
         menubar.add_cascade(label="System", menu=menu)
         menu.add_command(label="Guide", command=self.explain)
         menu.add_separator()
         menu.add_command(label="Export Graph", command=self.exportGraph)
         menu.add_command(label="Import Graph", command=self.importGraph)
+        menu.add_command(label="Export Picture", command=self.exportPicture)
+        menu.add_cascade(label="Export Compression", menu=menu3)
+        menu.add_command(label="Restore Last Session",
+                         command=self.restoreAutosave)
+        menu.add_checkbutton(label="Raster Tiles",
+                             variable=self.tileMode,
+                             command=self.toggleTiles)
+        for codec in CODECS:
+            menu3.add_radiobutton(
+                label=codec,
+                value=codec,
+                variable=self.compression,
+            )
         menubar.add_cascade(label="Theme", menu=menu2)
         for i, theme in enumerate(self.THEMENAME):
             menu2.add_radiobutton(
@@ -233,20 +295,23 @@ class GraphMonster:
             edgeFrame,
             text="Edges",
         ).pack(side="top", pady=(5, 0))
-        nodeNb = Notebook(nodeFrame)
-        nodeNb.pack(side="top", expand=1, fill="both")
-        edgeNb = Notebook(edgeFrame)
-        edgeNb.pack(side="top", expand=1, fill="both")
+        self.nodeNb = Notebook(nodeFrame)
+        self.nodeNb.pack(side="top", expand=1, fill="both")
+        self.edgeNb = Notebook(edgeFrame)
+        self.edgeNb.pack(side="top", expand=1, fill="both")
 
-        nodetmpFrames = [Frame(nodeNb) for _ in range(3)]
-        edgetmpFrames = [Frame(edgeNb) for _ in range(3)]
+        nodetmpFrames = [Frame(self.nodeNb) for _ in range(3)]
+        edgetmpFrames = [Frame(self.edgeNb) for _ in range(3)]
 
         for i, frame in enumerate(nodetmpFrames):
             frame.pack(side="top", fill="both", expand=1)
-            nodeNb.add(frame, text=self.OUTPUTSTYLES[i])
+            self.nodeNb.add(frame, text=self.OUTPUTSTYLES[i])
         for i, frame in enumerate(edgetmpFrames):
             frame.pack(side="bottom", fill="both", expand=1)
-            edgeNb.add(frame, text=self.OUTPUTSTYLES[i])
+            self.edgeNb.add(frame, text=self.OUTPUTSTYLES[i])
+        # Only the outputs of the selected tabs are kept up to date
+        self.nodeNb.bind("<<NotebookTabChanged>>", self.handleTabChange)
+        self.edgeNb.bind("<<NotebookTabChanged>>", self.handleTabChange)
 
         self.nodeEntrys = [
             Text(nodetmpFrames[i], width=21, height=2) for i in range(3)
@@ -255,12 +320,35 @@ class GraphMonster:
             Text(edgetmpFrames[i], width=21, height=5) for i in range(3)
         ]
 
+        nodeScrollbars = [Scrollbar(nodetmpFrames[i]) for i in range(3)]
+        edgeScrollbars = [Scrollbar(edgetmpFrames[i]) for i in range(3)]
+
         for i, entry in enumerate(self.nodeEntrys):
+            nodeScrollbars[i].pack(side="right", fill="y")
             entry.pack(side="top", fill="both", expand=1)
 
         for i, entry in enumerate(self.edgeEntrys):
+            edgeScrollbars[i].pack(side="right", fill="y")
             entry.pack(side="bottom", fill="both", expand=1)
 
+        self.nodePanes = [
+            OutputPane(entry, nodeScrollbars[i], self.VIRTUALUNITS)
+            for i, entry in enumerate(self.nodeEntrys)
+        ]
+        self.edgePanes = [
+            OutputPane(entry, edgeScrollbars[i], self.VIRTUALUNITS)
+            for i, entry in enumerate(self.edgeEntrys)
+        ]
+        # The whole output of a pane is copied or saved from its menu
+        for pane in self.nodePanes + self.edgePanes:
+            paneMenu = Menu(pane.text, tearoff=0)
+            paneMenu.add_command(label="Copy all",
+                                 command=partial(self.copyOutput, pane))
+            paneMenu.add_command(label="Save to file",
+                                 command=partial(self.saveOutput, pane))
+            pane.text.bind("<ButtonPress-3>",
+                           partial(self.showPaneMenu, paneMenu))
+
         Button(
             nodeFrame,
             text="Reset Labels",
@@ -276,6 +364,7 @@ class GraphMonster:
         )
 
         self.canvas.grid(row=0, column=0, sticky="SNWE")
+        self.canvas.tk.eval(BULKPROCS)
         self.canvas.bind("<ButtonPress-1>", self.handleLeftClick)
         self.canvas.bind("<ButtonPress-2>", self.handleMidClick)
         self.canvas.bind("<ButtonPress-3>", self.handlerightClick)
@@ -297,89 +386,545 @@ class GraphMonster:
         )
         self.mainWin.bind("<Control-z>", self.popCurData)
         self.mainWin.bind("<Control-y>", self.redoCurData)
+        self.mainWin.protocol("WM_DELETE_WINDOW", self.closeMain)
 
         self.handleStateChange(self.STATE_NODE)
         self.toggleTheme()
         self.updateOutPut()
         self.pushCurData()
+        self.mainWin.after(self.AUTOSAVEGAP, self.autosaveTick)
         self.mainWin.mainloop()
 
+    def closeMain(self):
+        self.autosave()
+        self.autosaver.close()
+        self.mainWin.destroy()
+
+    def autosave(self):
+        """
+        Hand a snapshot to the autosaver; the writing happens in its thread
+        """
+        if self.unsavedEdits:
+            self.unsavedEdits = 0
+            self.autosaver.save(self.model.nodeRecords(),
+                                self.model.edgeRecords())
+
+    def autosaveTick(self):
+        self.autosave()
+        self.mainWin.after(self.AUTOSAVEGAP, self.autosaveTick)
+
+    def restoreAutosave(self):
+        self.reformatState.set("Activate")
+        try:
+            self.model.loadRecords(*readJournal(self.AUTOSAVEPATH + ".last"),
+                                   self.NODESIZE)
+            self.pushCurData()
+        except:
+            Messagebox.show_error(title="Error",
+                                  message="No autosave to restore")
+
     def pushCurData(self, event=None):
-        data = self.encodeData()
-        if not self.graphHistory or self.graphHistory[self.historyIdx] != data:
-            self.historyIdx += 1
-            if len(self.graphHistory) == self.historyIdx:
-                self.graphHistory.append(None)
-            self.graphHistory[self.historyIdx] = (data, self.curScale)
+        # Only committed edits count, so dragging a node is a single edit
+        self.model.commit()
+        self.countEdit()
+
+    def countEdit(self):
+        """
+        Note an edit not yet autosaved; autosave every AUTOSAVEEDITS of them
+        """
+        self.unsavedEdits += 1
+        if self.unsavedEdits >= self.AUTOSAVEEDITS:
+            self.autosave()
 
     def popCurData(self, event):
-        if self.historyIdx:
-            self.historyIdx -= 1
-            data, scale = self.graphHistory[self.historyIdx]
-            self.deployData(data)
-            self.curScale = scale
+        if self.model.undo():
+            self.countEdit()
 
     def redoCurData(self, event):
-        if len(self.graphHistory) - 1 > self.historyIdx:
-            self.historyIdx += 1
-            data, scale = self.graphHistory[self.historyIdx]
-            self.deployData(data)
-            self.curScale = scale
+        if self.model.redo():
+            self.countEdit()
+
+    def noteOutputChange(self, event):
+        if isinstance(event, GraphLoaded):
+            self.outputStale = True
+        elif isinstance(event, (EdgeAdded, EdgeReweighted, EdgeRemoved)):
+            self.dirtyLines.add(event.tag)
+        else:
+            self.dirtyNodes.add(event.tag)
+            # The edges show the labels of their nodes
+            if isinstance(event, NodeRelabeled):
+                self.dirtyLines.update(self.graph.incident(event.tag))
+        self.scheduleFrame()
+
+    def scheduleFrame(self):
+        if not self.framePending:
+            self.framePending = True
+            self.canvas.after(self.FRAMEGAP, self.flushFrame)
+
+    def flushFrame(self):
+        """
+        Apply the changes of the model gathered during a frame to the
+        outputs
+        """
+        self.framePending = False
+        # Rewriting everything is cheaper once most of the elements changed
+        if self.outputStale or \
+                len(self.dirtyNodes) + len(self.dirtyLines) > \
+                (self.graph.nodeCount + self.graph.edgeCount) * \
+                self.OUTPUTREBUILDRATIO:
+            self.outputStale = False
+            self.updateOutPut()
+        elif self.dirtyNodes or self.dirtyLines:
+            self.patchOutPut()
+        self.dirtyNodes.clear()
+        self.dirtyLines.clear()
 
     def toggleTheme(self):
         themeIdx = self.curTheme.get()
         Style(self.THEMENAME[themeIdx])
-        for tag in self.canvas.find_all():
-            thisType = self.canvas.type(tag)
-            self.canvas.itemconfigure(
-                tag,
-                fill=self.COLORBOOK[thisType][themeIdx],
-            )
+        self.themeColors = {
+            thisType: colors[themeIdx]
+            for thisType, colors in self.COLORBOOK.items()
+        }
+        for tag, thisType in self.TAGTYPES.items():
+            self.canvas.itemconfigure(tag, fill=self.themeColors[thisType])
+        self.clearTiles()
+        if self.tileMode.get():
+            self.scheduleRefresh()
+
+    @property
+    def graph(self):
+        """
+        GraphStore of the model; replaced by undo, redo and imports
+        """
+        return self.model.store
+
+    @property
+    def data(self):
+        return self.model.data
+
+    # The canvas, the grids and the tiles follow the model at once
 
-    def encodeData(self):
-        compressedData = {"Node": {}, "Line": [], "curId": self.incre_idx}
-        for idx in self.canvas.find_all():
-            thisType = self.canvas.type(idx)
-            if thisType == "oval":
-                compressedData["Node"][tuple(self.canvas.coords(idx))] = \
-                    deepcopy(self.data["Node"][idx])
-            elif thisType == "line":
-                compressedData["Line"].append(deepcopy(self.data["Line"][idx]))
-        return compressedData
-
-    def deployData(self, data):
+    def onGraphLoaded(self, event):
         # Erase previous data
         self.canvas.delete("all")
-        self.data = {"Node": {}, "Line": {}}
-        # Parse and load data
-        self.incre_idx = data["curId"]
-        nodeValToObj = {}
-        scale = 1
-        for coord, node in data["Node"].items():
-            scale = node.scale
-            nodeId = self.drawNode(*coord)
-            textId = self.drawText(
-                *self.getCenter(coord),
-                mode=0,
-                text=str(node.val),
-            )
-            node.canvasIds = [nodeId, textId]
-            node.adjLines = set()
-            self.data["Node"][nodeId] = node
-            nodeValToObj[node.val] = node
-        self.curScale = scale
-        for line in data["Line"]:
-            line.node1 = nodeValToObj[line.node1.val]
-            line.node2 = nodeValToObj[line.node2.val]
+        self.assistLine = None
+        # A held node or a half-drawn edge belongs to the replaced graph
+        self.startNode = self.lineStartNode = self.EMPTY
+        self.pendingMotion = None
+        self.handleStateChange(self.curState)
+        self.nodeItems.clear()
+        self.lineItems.clear()
+        self.shownNodes.clear()
+        self.shownLines.clear()
+        self.nodeGrid.clear()
+        self.lineGrid.clear()
+        self.syncedPos.clear()
+        self.shownTiles.clear()
+        self.tileCache.clear()
+        self.hoverItem = (None, None)
+        graph = self.graph
+        for tag in graph.nodeIds():
+            self.nodeGrid.insertPoint(tag, graph.x[tag], graph.y[tag])
+            self.syncedPos[tag] = (graph.x[tag], graph.y[tag])
+        for tag in graph.edgeIds():
+            node1, node2 = graph.source[tag], graph.target[tag]
+            self.lineGrid.insertSegment(tag, graph.x[node1], graph.y[node1],
+                                        graph.x[node2], graph.y[node2])
+        self.refreshView()
+
+    def onNodeAdded(self, event):
+        tag = event.tag
+        x, y = self.graph.x[tag], self.graph.y[tag]
+        self.nodeGrid.insertPoint(tag, x, y)
+        self.syncedPos[tag] = (x, y)
+        self.invalidateTiles(x, y, x, y)
+
+    def onEdgeAdded(self, event):
+        tag = event.tag
+        line = self.data["Line"][tag]
+        self.lineGrid.insertSegment(tag, line.node1.x, line.node1.y,
+                                    line.node2.x, line.node2.y)
+        self.invalidateTiles(line.node1.x, line.node1.y, line.node2.x,
+                             line.node2.y)
+
+    def onNodeRemoved(self, event):
+        self.hideItems([event.tag], ())
+        self.invalidateTiles(event.x, event.y, event.x, event.y)
+        self.nodeGrid.remove(event.tag)
+        del self.syncedPos[event.tag]
+
+    def onEdgeRemoved(self, event):
+        self.hideItems((), [event.tag])
+        self.invalidateTiles(event.x1, event.y1, event.x2, event.y2)
+        self.lineGrid.remove(event.tag)
+
+    def onNodeMoved(self, event):
+        self.syncNode(self.data["Node"][event.tag])
+        for lineTag in self.graph.incident(event.tag):
+            self.reconnect(lineTag)
+
+    def onLayoutStepped(self, event):
+        # Redraw only the nodes which visibly moved, and their edges
+        graph = self.graph
+        dirtyLines = set()
+        epsilon = self.MOVEEPSILON / self.curScale
+        for tag in graph.nodeIds():
+            x, y = self.syncedPos[tag]
+            if abs(graph.x[tag] - x) > epsilon or \
+                    abs(graph.y[tag] - y) > epsilon:
+                self.syncNode(self.data["Node"][tag])
+                dirtyLines.update(graph.incident(tag))
+        for lineTag in dirtyLines:
+            self.reconnect(lineTag)
+        self.refreshView()
+
+    def onEdgeReweighted(self, event):
+        tag = event.tag
+        line = self.data["Line"][tag]
+        self.invalidateTiles(line.node1.x, line.node1.y, line.node2.x,
+                             line.node2.y)
+        if tag in self.lineItems:
+            textId = self.lineItems[tag][-1]
+            self.canvas.itemconfig(textId, text=str(line.weight))
+
+    def onNodeRelabeled(self, event):
+        tag = event.tag
+        if tag in self.nodeItems:
+            textId = self.nodeItems[tag][-1]
+            self.canvas.itemconfig(textId, text=self.graph.labels[tag])
+        x, y = self.graph.x[tag], self.graph.y[tag]
+        self.invalidateTiles(x, y, x, y)
+
+    def getViewRegion(self):
+        """
+        The visible part of the canvas, enlarged by VIEWMARGIN on every side
+        """
+        width = max(self.canvas.winfo_width(), int(self.canvas["width"]))
+        height = max(self.canvas.winfo_height(), int(self.canvas["height"]))
+        x, y = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        dx, dy = width * self.VIEWMARGIN, height * self.VIEWMARGIN
+        return x - dx, y - dy, x + width + dx, y + height + dy
+
+    def toCanvas(self, x, y):
+        return (x * self.curScale + self.viewOffset[0],
+                y * self.curScale + self.viewOffset[1])
+
+    def toWorld(self, x, y):
+        return ((x - self.viewOffset[0]) / self.curScale,
+                (y - self.viewOffset[1]) / self.curScale)
+
+    def zoom(self, x, y, scale):
+        """
+        Scale the view by scale around the canvas point (x, y).
+        Only the view transform changes here; the items on the canvas are
+        reprojected by the next refresh.
+        """
+        self.curScale *= scale
+        self.viewOffset = (x - (x - self.viewOffset[0]) * scale,
+                           y - (y - self.viewOffset[1]) * scale)
+        self.viewChanged = True
+        self.scheduleRefresh()
+
+    def scheduleRefresh(self):
+        if not self.refreshPending:
+            self.refreshPending = True
+            self.canvas.after_idle(self.refreshView)
+
+    def refreshView(self):
+        """
+        Create the items which came into view and delete those which left
+        """
+        self.refreshPending = False
+        x1, y1, x2, y2 = self.getViewRegion()
+        region = (*self.toWorld(x1, y1), *self.toWorld(x2, y2))
+        tier = sum(self.curScale < x for x in self.LODSCALES)
+        if tier != self.lodTier:
+            self.lodTier = tier
+            self.applyLOD()
+        if self.lodTier == len(self.LODSCALES):
+            self.hideItems(self.shownNodes.copy(), self.shownLines.copy())
+            self.clearTiles()
+            self.drawClusters(region)
+            return
+        nodeTags = self.nodeGrid.query(*region)
+        lineTags = self.lineGrid.query(*region)
+        if self.tileMode.get():
+            self.refreshTiles(x1, y1, x2, y2)
+            liveNodes, liveLines = self.getLiveTags()
+            nodeTags &= liveNodes
+            lineTags &= liveLines
+        self.hideItems(self.shownNodes - nodeTags, self.shownLines - lineTags)
+        if self.viewChanged:
+            self.viewChanged = False
+            self.reprojectItems()
+        self.showItems(nodeTags - self.shownNodes, lineTags - self.shownLines)
+
+    def reprojectItems(self):
+        """
+        Move the items on the canvas to the current view transform,
+        in a single Tcl call
+        """
+        items = []
+        for tag in self.shownNodes:
+            node = self.data["Node"][tag]
+            nodeId, textId = self.nodeItems[tag]
+            items += [nodeId, self.getNodeCoords(node),
+                      textId, self.toCanvas(node.x, node.y)]
+        for tag in self.shownLines:
+            line = self.data["Line"][tag]
             lineCoord = self.getLineCoords(line.node1, line.node2)
-            textCoord = self.linearComb(*lineCoord)
-            lineId = self.drawLine(*lineCoord)
-            textId = self.drawText(*textCoord, 1, str(line.weight))
-            line.node1.adjLines.add(lineId)
-            line.node2.adjLines.add(lineId)
-            line.canvasIds = [lineId, textId]
-            self.data["Line"][lineId] = line
-        self.updateOutPut()
+            lineId, textId = self.lineItems[tag]
+            items += [lineId, lineCoord, textId, self.linearComb(*lineCoord)]
+        if items:
+            self.canvas.tk.call("gmBulkCoords", str(self.canvas),
+                                tuple(items))
+
+    def applyLOD(self):
+        """
+        Switch the items already on the canvas to the current level of
+        detail, one tag at a time
+        """
+        self.canvas.delete("cluster")
+        self.canvas.itemconfigure("weight",
+                                  state=self.textStyle("weight")["state"])
+        self.canvas.itemconfigure("label",
+                                  state=self.textStyle("label")["state"])
+        self.canvas.itemconfigure("line", arrow=self.lineStyle()["arrow"])
+
+    def drawClusters(self, region):
+        """
+        Draw the nodes of every CLUSTERSIZE square (on the canvas) as one blob
+        """
+        self.canvas.delete("cluster")
+        buckets = {}
+        for tag in self.nodeGrid.query(*region):
+            node = self.data["Node"][tag]
+            x, y = self.toCanvas(node.x, node.y)
+            key = (x // self.CLUSTERSIZE, y // self.CLUSTERSIZE)
+            bucket = buckets.setdefault(key, [0, 0, 0])
+            bucket[0] += 1
+            bucket[1] += x
+            bucket[2] += y
+        blobs = []
+        for count, sumX, sumY in buckets.values():
+            x, y = sumX / count, sumY / count
+            r = min(self.CLUSTERSIZE / 2,
+                    max(3, self.NODESIZE * self.curScale * count**0.5))
+            blobs.append((x - r, y - r, x + r, y + r))
+        self.bulkCreate("oval", blobs, {
+            **self.nodeStyle(),
+            "state": "disabled",
+            "tags": "cluster",
+        })
+
+    def showItems(self, nodeTags, lineTags):
+        nodes = [self.data["Node"][tag] for tag in nodeTags]
+        nodeIds = self.bulkCreate(
+            "oval",
+            [self.getNodeCoords(node) for node in nodes],
+            self.nodeStyle(),
+        )
+        textIds = self.bulkCreate(
+            "text",
+            [(*self.toCanvas(node.x, node.y), "-text", str(node.val))
+             for node in nodes],
+            self.textStyle("label"),
+        )
+        for node, nodeId, textId in zip(nodes, nodeIds, textIds):
+            self.nodeItems[node.tag] = [nodeId, textId]
+        self.shownNodes.update(nodeTags)
+        lines = [self.data["Line"][tag] for tag in lineTags]
+        lineCoords = [self.getLineCoords(line.node1, line.node2)
+                      for line in lines]
+        lineIds = self.bulkCreate("line", lineCoords, self.lineStyle())
+        textIds = self.bulkCreate(
+            "text",
+            [(*self.linearComb(*coord), "-text", str(line.weight))
+             for coord, line in zip(lineCoords, lines)],
+            self.textStyle("weight"),
+        )
+        for line, lineId, textId in zip(lines, lineIds, textIds):
+            self.lineItems[line.tag] = [lineId, textId]
+        self.shownLines.update(lineTags)
+
+    def hideItems(self, nodeTags, lineTags):
+        ids = []
+        for tags, items, shown in ((nodeTags, self.nodeItems, self.shownNodes),
+                                   (lineTags, self.lineItems, self.shownLines)):
+            for tag in tags:
+                ids += items.pop(tag, ())
+                shown.discard(tag)
+        if ids:
+            self.canvas.delete(*ids)
+
+    def getCurrentItem(self, x, y):
+        """
+        ("Node"/"Line", id) at the canvas point (x, y), (None, None) if there
+        is nothing. Picked from the grids, so culled items and tiles are no
+        matter; a node wins over the edges under it. Nothing is picked while
+        the nodes are drawn as clusters, since no single node can be seen.
+        """
+        if self.curScale < self.LODSCALES[-1]:
+            return None, None
+        x, y = self.toWorld(x, y)
+        nodes, lines = self.data["Node"], self.data["Line"]
+        nodeTag = self.nodeGrid.nearest(
+            x,
+            y,
+            self.NODESIZE + self.NODEWIDTH / 2 / self.curScale,
+            lambda tag: hypot(nodes[tag].x - x, nodes[tag].y - y),
+        )
+        if nodeTag is not None:
+            return "Node", nodeTag
+        lineTag = self.lineGrid.nearest(
+            x,
+            y,
+            (self.LINEWIDTH / 2 + 1) / self.curScale,
+            lambda tag: segmentDistance(
+                x, y, lines[tag].node1.x, lines[tag].node1.y,
+                lines[tag].node2.x, lines[tag].node2.y),
+        )
+        return ("Line", lineTag) if lineTag is not None else (None, None)
+
+    def toggleTiles(self):
+        if self.tileMode.get() and not TILESUPPORT:
+            self.tileMode.set(0)
+            Messagebox.show_error(title="Error",
+                                  message="Raster tiles need Pillow")
+        self.clearTiles()
+        self.hoverItem = (None, None)
+        self.hideItems(self.shownNodes.copy(), self.shownLines.copy())
+        self.refreshView()
+
+    def getLiveTags(self):
+        """
+        Nodes and edges drawn as canvas items over the tiles:
+        the one under the pointer, the one being dragged with its edges
+        and the start of a new edge
+        """
+        nodeTags, lineTags = set(), set()
+        if self.startNode != self.EMPTY:
+            nodeTags.add(self.startNode.tag)
+            lineTags.update(self.startNode.adjLines)
+        if self.lineStartNode != self.EMPTY:
+            nodeTags.add(self.lineStartNode.tag)
+        kind, tag = self.hoverItem
+        if kind == "Node" and tag in self.data["Node"]:
+            nodeTags.add(tag)
+        elif kind == "Line" and tag in self.data["Line"]:
+            lineTags.add(tag)
+        return nodeTags, lineTags
+
+    def refreshTiles(self, x1, y1, x2, y2):
+        """
+        Put the tiles covering the canvas region on the canvas, rendering
+        those missing from the cache
+        """
+        zoom = self.curScale
+        ox, oy = self.viewOffset
+        keys = self.tileCache.keysIn(zoom, x1 - ox, y1 - oy, x2 - ox, y2 - oy)
+        for key in self.shownTiles.keys() - keys:
+            self.canvas.delete(self.shownTiles.pop(key)[0])
+        size = self.tileCache.tileSize
+        for key in keys - self.shownTiles.keys():
+            image = self.tileCache.get(key)
+            if image is None:
+                image = self.renderTile(key)
+                self.tileCache.put(key, image)
+            left, top = ox + key[1] * size, oy + key[2] * size
+            self.shownTiles[key] = (self.canvas.create_image(
+                left,
+                top,
+                anchor="nw",
+                image=image,
+                state="disabled",
+                tags="tile",
+            ), image)
+        self.canvas.tag_lower("tile")
+
+    def renderTile(self, key):
+        """
+        Image of the tile with all but the live items
+        """
+        zoom, i, j = key
+        size = self.tileCache.tileSize
+        left = self.viewOffset[0] + i * size
+        top = self.viewOffset[1] + j * size
+        margin = self.NODESIZE + self.TILEMARGIN / zoom
+        region = (i * size / zoom - margin, j * size / zoom - margin,
+                  (i + 1) * size / zoom + margin,
+                  (j + 1) * size / zoom + margin)
+        skipNodes, skipLines = set(), set()
+        if self.startNode != self.EMPTY:
+            skipNodes.add(self.startNode.tag)
+            skipLines.update(self.startNode.adjLines)
+        nodes = [self.data["Node"][tag]
+                 for tag in self.nodeGrid.query(*region) - skipNodes]
+        lines = [self.data["Line"][tag]
+                 for tag in self.lineGrid.query(*region) - skipLines]
+        lineCoords = [self.getLineCoords(line.node1, line.node2)
+                      for line in lines]
+        arrow = self.lineStyle()["arrow"] == "last"
+        texts = []
+        if self.textStyle("weight")["state"] != "hidden":
+            texts += [(*self.linearComb(*coord), str(line.weight))
+                      for coord, line in zip(lineCoords, lines)]
+        if self.textStyle("label")["state"] != "hidden":
+            texts += [(*self.toCanvas(node.x, node.y), str(node.val))
+                      for node in nodes]
+        image = renderTile(
+            size,
+            left,
+            top,
+            [(*coord, arrow) for coord in lineCoords],
+            [self.getNodeCoords(node) for node in nodes],
+            texts,
+            {
+                **self.themeColors,
+                "lineWidth": self.LINEWIDTH,
+                "nodeWidth": self.NODEWIDTH,
+                "fontSize": self.textStyle("label")["font"][1],
+            },
+        )
+        return toPhotoImage(image, self.canvas)
+
+    def invalidateTiles(self, x1, y1, x2, y2):
+        """
+        Drop the tiles touching the world rectangle spanned by two points
+        """
+        if not self.tileMode.get():
+            return
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        margin = self.NODESIZE + self.LINETAGOFFSET
+        x1, y1, x2, y2 = x1 - margin, y1 - margin, x2 + margin, y2 + margin
+        self.tileCache.invalidate(x1, y1, x2, y2, self.TILEMARGIN)
+        for key in [x for x in self.shownTiles
+                    if self.tileCache.touches(x, x1, y1, x2, y2, self.TILEMARGIN)]:
+            self.canvas.delete(self.shownTiles.pop(key)[0])
+        self.scheduleRefresh()
+
+    def invalidateNode(self, node, x=None, y=None):
+        """
+        Drop the tiles showing the node or one of its edges,
+        with the node at (x, y) if given
+        """
+        if not self.tileMode.get():
+            return
+        if x is None:
+            x, y = node.x, node.y
+        self.invalidateTiles(x, y, x, y)
+        for lineTag in node.adjLines:
+            line = self.data["Line"][lineTag]
+            other = line.node2 if line.node1 == node else line.node1
+            self.invalidateTiles(x, y, other.x, other.y)
+
+    def clearTiles(self):
+        if self.shownTiles:
+            self.canvas.delete("tile")
+            self.shownTiles.clear()
+        self.tileCache.clear()
 
     def exportGraph(self):
         self.reformatState.set("Activate")
@@ -387,12 +932,47 @@ class GraphMonster:
             obj = asksaveasfile(
                 title="Save Graph Monster Data",
                 mode="wb",
-                filetypes=(("Graph Monster Graph", "*.gmg"), ),
+                filetypes=self.GRAPHFILETYPES,
                 defaultextension=".gmg",
             )
             if obj:
                 with obj as file:
-                    dump(self.encodeData(), file)
+                    self.model.write(file,
+                                     splitext(file.name)[1].lower(),
+                                     self.compression.get())
+        except:
+            Messagebox.show_error(title="Error", message="Saving Failed")
+
+    def exportPicture(self):
+        self.reformatState.set("Activate")
+        try:
+            obj = asksaveasfile(
+                title="Save Graph Picture",
+                mode="wb",
+                filetypes=self.PICTUREFILETYPES,
+                defaultextension=".svg",
+            )
+            if obj:
+                with obj as file:
+                    ext = splitext(file.name)[1].lower()
+                    if ext == ".png" and not PNGSUPPORT:
+                        Messagebox.show_error(
+                            title="Error", message="PNG pictures need Pillow")
+                        return
+                    PICTUREFORMATS.get(ext, PICTUREFORMATS[".svg"])(
+                        file,
+                        self.model.nodeRecords(),
+                        self.model.edgeRecords(),
+                        self.themeColors,
+                        {
+                            "nodeSize": self.NODESIZE,
+                            "nodeWidth": self.NODEWIDTH,
+                            "lineWidth": self.LINEWIDTH,
+                            "labelOffset": self.LINETAGOFFSET,
+                            "fontSize": self.textStyle("label")["font"][1],
+                            "margin": 2 * self.NODESIZE,
+                        },
+                    )
         except:
             Messagebox.show_error(title="Error", message="Saving Failed")
 
@@ -402,12 +982,13 @@ class GraphMonster:
             obj = askopenfile(
                 title="Load Graph Monster Data",
                 mode="rb",
-                filetypes=(("Graph Monster Graph", "*.gmg"), ),
+                filetypes=self.GRAPHFILETYPES,
                 defaultextension=".gmg",
             )
             if obj:
                 with obj as file:
-                    self.deployData(load(file))
+                    self.model.read(file, splitext(file.name)[1].lower(),
+                                    self.NODESIZE)
                     self.pushCurData()
         except:
             Messagebox.show_error(title="Error", message="Loading Failed")
@@ -502,20 +1083,22 @@ class GraphMonster:
             self.reformatState.set("Stop")
             if self.checkReformatParas():
                 self.formatStatus.set("Running...")
-                while self.reformatState.get() == "Stop" and self.data["Node"]:
-                    coordBook = {
-                        idx: self.canvas.coords(idx)
-                        for idx in self.data["Node"]
-                    }
-                    signal = self.manipulate(coordBook)
+                while self.reformatState.get() == "Stop" and self.graph.nodeCount:
+                    signal = self.model.layoutStep(
+                        self.getLayout(),
+                        self.startNode.tag
+                        if self.startNode != self.EMPTY else None,
+                    )
+                    self.canvas.update()
+                    time.sleep(self.CANVASUPDATEGAP)
                     if signal and self.formatStatus.get() != "Converged":
                         self.formatStatus.set("Converged")
                     elif not signal and self.formatStatus.get() != "Running":
                         self.formatStatus.set("Running")
                 # Set all nodes static
-                for node in self.data["Node"].values():
-                    node.a = [0, 0]
-                    node.v = [0, 0]
+                self.model.stopMotion()
+                # The nodes moved, so a run is an edit to autosave
+                self.countEdit()
             else:
                 self.formatStatus.set("Invalid Input")
                 self.reformatState.set("Activate")
@@ -523,98 +1106,25 @@ class GraphMonster:
             self.formatStatus.set("Converged" if signal else "Aborted")
         self.reformatState.set("Activate")
 
+    def getLayout(self):
+        """
+        ForceLayout with the parameters of the reformatter
+        """
+        return ForceLayout(
+            damping=self.damping.get(),
+            nodeMass=self.nodeMass.get(),
+            elasticity=self.elasticity.get(),
+            idealEdgeLen=self.idealEdgeLen.get(),
+            repelFactor=self.repelFactor.get(),
+            repelThreshold=self.repelThreshold.get(),
+        )
+
     def checkReformatParas(self):
         try:
-            return 0.05 <= self.damping.get() <= 0.95 and \
-                    10 <= self.nodeMass.get() <= 100 and \
-                    0.5 <= self.elasticity.get() <= 10 and \
-                    1 <= self.idealEdgeLen.get() and \
-                    10 <= self.repelFactor.get() <= 75
+            return self.getLayout().checkParas()
         except:
             return 0
 
-    def getAdjNodes(self, node: Node) -> set[str]:
-        '''
-        return set of node ids
-        '''
-        total = set()
-        for lineId in node.adjLines:
-            line = self.data["Line"][lineId]
-            if line.node1 == node or line.node2 == node:
-                total.add(line.node1.canvasIds[0] if line.node2 ==
-                          node else line.node2.canvasIds[0])
-        return total
-
-    def manipulate(self, coordBook):
-        if not coordBook: return 1
-        # set node status
-        for node in self.data["Node"].values():
-            holdingNodes = self.canvas.find_withtag("current")
-            if holdingNodes and node.canvasIds[0] == holdingNodes[0]: continue
-            fx = fy = 0
-            adjNodeIds = self.getAdjNodes(node)
-            startCoord = self.getCenter(coordBook[node.canvasIds[0]])
-            for endNode in self.data["Node"].values():
-                endCoord = self.getCenter(coordBook[endNode.canvasIds[0]])
-                if endNode.canvasIds[0] in adjNodeIds:
-                    dfx, dfy = self.getForce(startCoord, endCoord)
-                elif endNode != node:
-                    dfx, dfy = self.getRepel(startCoord, endCoord)
-                else:
-                    dfx = dfy = 0
-                fx += dfx
-                fy += dfy
-            self.setNodeAcc(node, fx, fy)
-            deltaS = self.move(node)
-            self.canvas.move(node.canvasIds[0], *deltaS)
-            self.canvas.move(node.canvasIds[1], *deltaS)
-            if not node.adjLines:
-                node.a = [0, 0]
-                node.v = [0, 0]
-        for line in self.data["Line"]:
-            self.reconnect(line)
-        self.canvas.update()
-        time.sleep(self.CANVASUPDATEGAP)
-        # Check for motion status
-        for node in self.data["Node"].values():
-            if max(node.a) >= self.motionTolerance and max(
-                    node.v) >= self.motionTolerance:
-                break
-        else:
-            return 1
-        return 0
-
-    def setNodeAcc(self, node, fx, fy):
-        ax, ay = fx / self.nodeMass.get(), fy / self.nodeMass.get()
-        node.a[0] = ax
-        node.a[1] = ay
-
-    def move(self, node):
-        vt = node.v
-        vt[0] += node.a[0]
-        vt[1] += node.a[1]
-        vt[0] *= (1 - self.damping.get())
-        vt[1] *= (1 - self.damping.get())
-        return vt
-
-    def getForce(self, startCoord, endCoord):
-        (x1, y1), (x2, y2) = startCoord, endCoord
-        d = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
-        f = self.elasticity.get() * (d -
-                                     self.idealEdgeLen.get() * self.curScale)
-        deg = atan2((y2 - y1), (x1 - x2))
-        return -f * cos(deg), f * sin(deg)
-
-    def getRepel(self, startCoord, endCoord):
-        (x1, y1), (x2, y2) = startCoord, endCoord
-        d = ((x1 - x2)**2 + (y1 - y2)**2)**0.5
-        length = self.repelThreshold.get() * self.curScale
-        if d > length:
-            return 0, 0
-        f = -length / ((d + 1e-3) / self.repelFactor.get())**2
-        deg = atan2((y2 - y1), (x1 - x2))
-        return -f * cos(deg), f * sin(deg)
-
     def explain(self):
         msg = """
         Switching to "Node" mode (Ctrl + q), you can "add" nodes to canvas and "drag" them.
@@ -626,8 +1136,12 @@ class GraphMonster:
         The nodes and edges are shown in the lower left corner. There is a fine line between 2 regions, and you can drag it to adjust te relative size between them.
         You can change the skin in "Theme" menu.
         The "Graph Reformatter" is a physics-based model which will reformat the graph by rearranging nodes accoding to thier connectivity. Edges can be considered as springs.
-        You can save and load the graph using "Export Graph" and "Import Graph".
+        For very large graphs, "Raster Tiles" (needs Pillow) draws the graph as cached images, which makes panning faster.
+        "Export Picture" saves the graph as an SVG or (with Pillow) PNG picture; "python -m Graph.render" does the same from the command line.
+        You can save and load the graph using "Export Graph" and "Import Graph". GraphML (.graphml), GEXF (.gexf) and edge lists (.txt, .edges; "label1 label2 weight" per line) are supported as well. Exported files can be compressed, see "Export Compression".
+        The graph is autosaved in the background; "Restore Last Session" brings back the graph of the previous run.
         You can customize graph output using "Output Customizer". You can find detailed guide there.
+        Right click an output to copy it or save it to a file. Very large outputs only show the lines you scroll to.
         You can press Ctrl+Z/Y to cancel and redo operations.
         """
         Messagebox.ok(title="Guide", message=msg.replace("  ", ""))
@@ -636,26 +1150,21 @@ class GraphMonster:
         return self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
 
     def resetLabel(self):
-        self.incre_idx = -1
-        for tag in self.data["Node"]:
-            node = self.data["Node"][tag]
-            node.val = self.getNodeIdx()
-            textId = node.canvasIds[-1]  # Text id
-            self.canvas.itemconfig(textId, text=node.val)
-        self.updateOutPut()
+        self.model.resetLabels()
+        self.countEdit()
 
     def handleMidClick(self, event):
-        curIds = self.canvas.find_withtag("current")
-        if curIds and (curId := curIds[0]) in self.data["Line"]:
-            line = self.data["Line"][curId]
+        kind, curTag = self.getCurrentItem(*self.getCanvasCoords(event))
+        if kind == "Line":
+            line = self.data["Line"][curTag]
             self.edgeConfigUI(
-                curId,
+                curTag,
                 f"{line.node1.val} -> {line.node2.val}",
                 event.x,
                 event.y,
             )
 
-    def edgeConfigUI(self, lineId, edgeInfo: str, x, y):
+    def edgeConfigUI(self, lineTag, edgeInfo: str, x, y):
         setWin = Toplevel(self.mainWin)
         setWin.geometry(f"+{x+550}+{y+230}")
 
@@ -681,7 +1190,7 @@ class GraphMonster:
         Button(
             setWin,
             text="Commit",
-            command=partial(self.commitWeight, lineId),
+            command=partial(self.commitWeight, lineTag),
         ).grid(row=2, column=0, padx=60, sticky="NWE")
         Label(
             setWin,
@@ -691,15 +1200,11 @@ class GraphMonster:
 
         setWin.mainloop()
 
-    def commitWeight(self, lineId):
+    def commitWeight(self, lineTag):
         try:
-            weight = eval(self.edgeWeightEntry.get())
-            line = self.data["Line"][lineId]
-            textId = line.canvasIds[-1]
-            line.weight = weight
-            self.canvas.itemconfig(textId, text=str(weight))
+            weight = parseWeight(self.edgeWeightEntry.get())
+            self.model.setWeight(lineTag, weight)
             self.settingStatus.set(f"Successfully set to {weight}")
-            self.updateOutPut()
             # weight set
             self.pushCurData()
         except:
@@ -716,85 +1221,52 @@ class GraphMonster:
                                 else "fleur"
 
     def handleLeftClick(self, event):
+        self.applyMotion()
         if self.curState == self.STATE_DRAG:
             self.canvas.scan_mark(event.x, event.y)
         else:
             event.x, event.y = self.getCanvasCoords(event)
+            curKind, curTag = self.getCurrentItem(event.x, event.y)
             # if state is node
             if self.curState == self.STATE_NODE:
                 # if not holding a node
                 if self.startNode == self.EMPTY:
                     # if clicked on nothing
-                    if not (curIds := self.canvas.find_withtag("current")):
-                        offset = self.NODESIZE * self.curScale
-                        key = (
-                            event.x - offset,
-                            event.y - offset,
-                            event.x + offset,
-                            event.y + offset,
-                        )
-                        idx = self.getNodeIdx()
-                        nodeId = self.drawNode(*key)
-                        self.data["Node"][nodeId] = Node(
-                            idx,
-                            scale=self.curScale,
-                            canvasIds=[
-                                nodeId,
-                                self.drawText(
-                                    key[0] + offset,
-                                    key[1] + offset,
-                                    mode=0,
-                                    text=str(idx),
-                                )
-                            ],
-                        )
+                    if curKind is None:
+                        x, y = self.toWorld(event.x, event.y)
+                        self.model.addNode(x=x, y=y)
+                        self.refreshView()
                         self.pushCurData()
                     # if click on a node
-                    elif curIds and curIds[0] in self.data["Node"]:
-                        self.startNode = self.data["Node"][curIds[0]]
+                    elif curKind == "Node":
+                        self.startNode = self.data["Node"][curTag]
+                        self.invalidateNode(self.startNode)
                         self.lineBtn["state"] = self.dragBtn[
                             "state"] = "disabled"
                 # if holding a node
                 else:
+                    self.invalidateNode(self.startNode)
                     self.startNode = self.EMPTY
                     self.lineBtn["state"] = self.dragBtn["state"] = "normal"
                     # Trace Movement
                     self.pushCurData()
 
             # If state is line, clicked on a node, and the node is a different one (no self-loop)
-            elif self.curState == self.STATE_LINE and \
-                    (curIds := self.canvas.find_withtag("current")) and \
-                    (nodeId := curIds[0]) in self.data["Node"]:
+            elif self.curState == self.STATE_LINE and curKind == "Node":
                 # Get the current node info (center and label)
-                lineEndNode = self.data["Node"][nodeId]
+                lineEndNode = self.data["Node"][curTag]
                 # If we choose the end of a line
                 if self.lineStartNode != self.EMPTY:
-                    # self-loop check
-                    if lineEndNode == self.lineStartNode:
+                    # self-loop and replicacy check
+                    if not self.model.canConnect(self.lineStartNode.tag,
+                                                 lineEndNode.tag):
                         return
-                    # replicacy check
-                    for line in self.data["Line"].values():
-                        if line.node1 == self.lineStartNode and line.node2 == lineEndNode:
-                            return
-                    coords = self.getLineCoords(self.lineStartNode,
-                                                lineEndNode)
-                    lineId = self.drawLine(*coords)
-                    self.data["Line"][lineId] = Line(
-                        self.lineStartNode,
-                        lineEndNode,
-                        1,
-                        [
-                            lineId,
-                            self.drawText(
-                                *self.linearComb(*coords), mode=1, text="1")
-                        ],
-                    )
-                    self.lineStartNode.adjLines.add(lineId)
-                    lineEndNode.adjLines.add(lineId)
+                    self.model.addLine(self.lineStartNode.tag, lineEndNode.tag)
+                    self.refreshView()
                     self.lineStartNode = self.EMPTY
                     self.NodeBtn["state"] = self.dragBtn["state"] = "normal"
                     self.canvas.config(cursor="")
-                    self.canvas.delete("tmp")  # Get rid of assist line
+                    self.hideAssistLine()
                     # Trace add
                     self.pushCurData()
                 # If we choose the start of a line
@@ -802,120 +1274,124 @@ class GraphMonster:
                     self.lineStartNode = lineEndNode
                     self.NodeBtn["state"] = self.dragBtn["state"] = "disabled"
                     self.canvas.config(cursor="tcross")
-        self.updateOutPut()
 
     def handlerightClick(self, event):
-        if self.curState == self.STATE_LINE and not self.canvas.coords(
-                "current") and self.lineStartNode != self.EMPTY:
+        thisKind, thisTag = self.getCurrentItem(*self.getCanvasCoords(event))
+        if self.curState == self.STATE_LINE and thisKind is None \
+                and self.lineStartNode != self.EMPTY:
             self.lineStartNode = self.EMPTY
             self.NodeBtn["state"] = self.dragBtn["state"] = "normal"
             self.canvas.config(cursor="")
-            self.canvas.delete("tmp")  # get rid of assist line
-        elif (curIds := self.canvas.find_withtag("current")) and \
-                self.lineStartNode == self.EMPTY:
-            thisId = curIds[0]
-            if thisId in self.data["Node"] and \
-                    self.data["Node"][thisId] != self.startNode:
-                node = self.data["Node"][thisId]
-                # maintain canvas
-                self.canvas.delete(*node.canvasIds)  # node & text
-                self.canvas.delete(*node.adjLines)  # edge
-                self.canvas.delete(*[  # edge text
-                    self.data["Line"][x].canvasIds[-1] for x in node.adjLines
-                ])
-                # maintain data
-                del self.data["Node"][thisId]  # node
-                for lineId in node.adjLines.copy():  # edge
-                    # maintain adjacent nodes
-                    line = self.data["Line"][lineId]
-                    for connectedNode in (line.node1, line.node2):
-                        connectedNode.adjLines.discard(lineId)
-                    del self.data["Line"][lineId]
-
-            elif thisId in self.data["Line"]:
-                line = self.data["Line"][thisId]
-                # maintain data
-                for connectedNode in (line.node1, line.node2):
-                    connectedNode.adjLines.discard(thisId)  # adjacent nodes
-                del self.data["Line"][thisId]  # edge
-                # maintain canvas
-                self.canvas.delete(*line.canvasIds)
+            self.hideAssistLine()
+        elif thisKind is not None and self.lineStartNode == self.EMPTY:
+            if thisKind == "Node" and \
+                    self.data["Node"][thisTag] != self.startNode:
+                # node, its edges and their canvas items
+                self.model.removeNode(thisTag)
+
+            elif thisKind == "Line":
+                self.model.removeLine(thisTag)
 
             # Trace delete
             self.pushCurData()
 
-        self.updateOutPut()
-
     def handleMotion(self, event):
-        event.x, event.y = self.getCanvasCoords(event)
-        self.canvas.delete("tmp")
+        """
+        Motion events are coalesced; the latest one is applied once per frame
+        """
+        if self.pendingMotion is None:
+            self.canvas.after(self.FRAMEGAP, self.applyMotion)
+        self.pendingMotion = self.getCanvasCoords(event)
+
+    def applyMotion(self):
+        if self.pendingMotion is None:
+            return
+        x, y = self.pendingMotion
+        self.pendingMotion = None
+        if self.tileMode.get():
+            hoverItem = self.getCurrentItem(x, y)
+            if hoverItem != self.hoverItem:
+                self.hoverItem = hoverItem
+                self.scheduleRefresh()
         if self.curState == self.STATE_LINE and self.lineStartNode != self.EMPTY:
-            self.canvas.create_line(
-                self.getLineCoords(self.lineStartNode, Node(-1, scale=0),
-                                   event.x, event.y),
-                width=self.LINEWIDTH,
-                state="disabled",
-                arrow="last",
-                fill="grey",
-                tags="tmp",
-                dash=".",
-            )
+            coords = self.getLineCoords(self.lineStartNode, None, x, y)
+            if self.assistLine is None:
+                self.assistLine = self.canvas.create_line(
+                    coords,
+                    width=self.LINEWIDTH,
+                    state="disabled",
+                    arrow="last",
+                    fill="grey",
+                    tags="tmp",
+                    dash=".",
+                )
+            else:
+                self.canvas.coords(self.assistLine, list(coords))
+                self.canvas.itemconfigure(self.assistLine, state="disabled")
         elif self.curState == self.STATE_NODE and self.startNode != self.EMPTY:
-            ## Change Node
-            nodeId, textId = self.startNode.canvasIds
-            offset = self.NODESIZE * self.data["Node"][nodeId].scale
-            ovalCoord = [
-                event.x - offset,
-                event.y - offset,
-                event.x + offset,
-                event.y + offset,
-            ]
-            self.canvas.coords(textId, list(self.getCenter(ovalCoord)))
-            self.canvas.coords(nodeId, ovalCoord)
-            ## Change adjacent edges
-            for lineId in self.startNode.adjLines:
-                self.reconnect(lineId)
+            ## Change Node and its edges
+            self.model.moveNode(self.startNode.tag, *self.toWorld(x, y))
+            self.scheduleRefresh()
+
+    def hideAssistLine(self):
+        if self.assistLine is not None:
+            self.canvas.itemconfigure(self.assistLine, state="hidden")
 
     def handleWheel(self, event, signal=0):
         if self.curState == self.STATE_DRAG and not signal:
             event.x, event.y = self.getCanvasCoords(event)
             scale = 1 / self.SCALERATIO if event.num == 5 or event.delta == -120 else self.SCALERATIO
-            self.curScale *= scale
-            self.canvas.scale("all", event.x, event.y, scale, scale)
-            for node in self.data["Node"].values():
-                node.scale *= scale
+            self.zoom(event.x, event.y, scale)
         elif signal:
             scale = 1 / self.SCALERATIO if event.num == 5 else self.SCALERATIO
-            self.curScale *= scale
-            self.canvas.scale("all", event.x, event.y, scale, scale)
+            self.zoom(event.x, event.y, scale)
 
     def handleMove(self, event):
         if self.curState == self.STATE_DRAG:
             self.canvas.scan_dragto(event.x, event.y, gain=1)
-
-    def getNodeIdx(self):
-        self.incre_idx += 1
-        return self.incre_idx
+            self.scheduleRefresh()
 
     def getSlope(self, x0, y0, x1, y1):
         return atan((y0 - y1) / (x0 - x1)) if x0 != x1 else self.EMPTY
 
-    def getCenter(self, coord):
-        return (coord[0] + coord[2]) / 2, (coord[1] + coord[3]) / 2
+    def getNodeCoords(self, node):
+        """
+        Bounding box of a node on the canvas
+        """
+        x, y = self.toCanvas(node.x, node.y)
+        offset = self.NODESIZE * self.curScale
+        return (
+            x - offset,
+            y - offset,
+            x + offset,
+            y + offset,
+        )
 
     def getLineCoords(self, startNode, endNode, xt=None, yt=None):
-        xs, ys = self.getCenter(self.canvas.coords(startNode.canvasIds[0]))
+        """
+        Edge between two nodes on the canvas, or from startNode to the
+        canvas point (xt, yt) if given
+        """
+        xs, ys = self.toCanvas(startNode.x, startNode.y)
         if xt is None:
-            xt, yt = self.getCenter(self.canvas.coords(endNode.canvasIds[0]))
+            xt, yt = self.toCanvas(endNode.x, endNode.y)
+            return self.lineCoordsBetween(xs, ys, xt, yt, self.curScale,
+                                          self.curScale)
+        return self.lineCoordsBetween(xs, ys, xt, yt, self.curScale, 0)
+
+    def lineCoordsBetween(self, xs, ys, xt, yt, startScale, endScale):
+        """
+        Edge from center (xs, ys) to center (xt, yt), cut at both circles
+        """
         deg = self.getSlope(xs, ys, xt, yt)
         flag = -1 if xs > xt else 1
         dx, dy = cos(deg) * self.NODESIZE, \
                  sin(deg) * self.NODESIZE
         return (
-            xs + flag * dx * startNode.scale,
-            ys + flag * dy * startNode.scale,
-            xt - flag * dx * endNode.scale,
-            yt - flag * dy * endNode.scale,
+            xs + flag * dx * startScale,
+            ys + flag * dy * startScale,
+            xt - flag * dx * endScale,
+            yt - flag * dy * endScale,
         )
 
     def explainCustomizer(self):
@@ -1024,7 +1500,7 @@ class GraphMonster:
             )
             if obj:
                 with obj as file:
-                    data, nodeModeData, lineModeData = load(file)
+                    data, nodeModeData, lineModeData = readStyle(file)
                     self.customNodeMode.set(nodeModeData)
                     self.customLineMode.set(lineModeData)
                     self.loadStyleToUIData(data, nodeModeData, lineModeData)
@@ -1043,13 +1519,11 @@ class GraphMonster:
             )
             if obj:
                 with obj as file:
-                    dump(
-                        [
-                            self.curOutputStyle,
-                            self.customNodeMode.get(),
-                            self.customLineMode.get(),
-                        ],
+                    writeStyle(
                         file,
+                        self.curOutputStyle,
+                        self.customNodeMode.get(),
+                        self.customLineMode.get(),
                     )
             else:
                 self.CustomStatusIndicator.set("File not opened")
@@ -1076,7 +1550,7 @@ class GraphMonster:
         """
         if styleOutputData is None:
             styleOutputData = self.ouputData
-        ans = deepcopy(self.defaultOutputStyle)
+        ans = deepcopy(DEFAULTOUTPUTSTYLE)
         data = styleOutputData["Node"]
         ans["Node"]["unit"] = data[0].get()
         ans["Node"]["list"] = [data[1].get(), data[2].get()]
@@ -1093,9 +1567,12 @@ class GraphMonster:
         flow: Parsing -> Check -> Apply
         """
         tmp = self.parseCustom(UIData)
-        if self.checkCustomedStyle(tmp, self.customNodeMode.get(),
-                                   self.customLineMode.get()):
+        if checkCustomedStyle(tmp, self.customNodeMode.get(),
+                              self.customLineMode.get()):
             self.curOutputStyle = tmp
+            self.curOutputFormats = outputFormats(tmp,
+                                                  self.customNodeMode.get(),
+                                                  self.customLineMode.get())
             self.CustomStatusIndicator.set("Succeeded")
             self.updateOutPut()
         else:
@@ -1104,71 +1581,85 @@ class GraphMonster:
     def toggleCusMode(self, modeVar, statusVar):
         statusVar.set(self.modeStatusBook[modeVar.get()])
 
-    def checkCustomedStyle(self, style, modeN, modeL):
-        '''
-        check base data
-        mode = 0: line mode
-        mode = 1: list mode
-        '''
-        nodeU, nodeL, nodeS = style["Node"].values()
-        lineU, lineL, lineS = style["Line"].values()
-        return (not modeN or (all(nodeL) and nodeS)) and \
-                (not modeL or (all(lineL) and lineS))
+    def getOutputSources(self):
+        """
+        (pane, views, unit, frame) of the six output panes; views is the
+        "Node" or "Line" map shown
+        """
+        nodes, lines = self.data["Node"], self.data["Line"]
+        for i, ((nodeUnit, nodeFrame), (lineUnit, lineFrame)) in \
+                enumerate(self.curOutputFormats):
+            yield self.nodePanes[i], nodes, nodeUnit, nodeFrame
+            yield self.edgePanes[i], lines, lineUnit, lineFrame
 
-    def getCustomedOutput(self, modeN, modeL):
-        '''
-        use base data to get strings
-            mode = 0: line mode
-            mode = 1: list mode
-        '''
-        nodeU, nodeL, nodeS = self.curOutputStyle["Node"].values()
-        lineU, lineL, lineS = self.curOutputStyle["Line"].values()
-        nodeUnits = [
-            nodeU.replace("label", str(x)) for x in self.data["Node"].values()
-        ]
-        nodeStr = (nodeS.join(nodeUnits)).join(nodeL) if modeN \
-                else "\n".join(nodeUnits)
-        lineUnits = [
-            lineU.replace("node1", str(x.node1)).replace(
-                "node2", str(x.node2)).replace("weight", str(x.weight))
-            for x in self.data["Line"].values()
-        ]
-        lineStr = (lineS.join(lineUnits)).join(lineL) if modeL \
-                else "\n".join(lineUnits)
-        return nodeStr, lineStr
-
-    def updateOutPut(self):
-        for entry in self.nodeEntrys:
-            entry.delete("1.0", "end")
-        for entry in self.edgeEntrys:
-            entry.delete("1.0", "end")
-        # Python
-        self.nodeEntrys[0].insert(
-            "1.0",
-            str(list(map(
-                lambda x: x.val,
-                self.data["Node"].values(),
-            ))),
-        )
-        self.edgeEntrys[0].insert(
-            "1.0",
-            str([line.getView() for line in self.data["Line"].values()]),
-        )
-        # Line
-        self.nodeEntrys[1].insert(
-            "1.0",
-            "\n".join(map(str, self.data["Node"].values())),
-        )
-        self.edgeEntrys[1].insert(
-            "1.0",
-            "\n".join(" ".join(map(str, line.getView()))
-                      for line in self.data["Line"].values()),
-        )
-        # customized
-        nodeStr, lineStr = self.getCustomedOutput(self.customNodeMode.get(),
-                                                  self.customLineMode.get())
-        self.nodeEntrys[2].insert("1.0", nodeStr)
-        self.edgeEntrys[2].insert("1.0", lineStr)
+    def getShownPanes(self):
+        return (self.nodePanes[self.nodeNb.index("current")],
+                self.edgePanes[self.edgeNb.index("current")])
+
+    def updateOutPut(self, force=True):
+        """
+        Rewrite the panes of the selected tabs, or only the stale ones if
+        not force; the others are rewritten once selected
+        """
+        shown = self.getShownPanes()
+        for pane, views, unit, frame in self.getOutputSources():
+            if pane not in shown:
+                pane.stale = True
+            elif force or pane.stale:
+                pane.reset(views, partial(self.formatUnit, views, unit),
+                           frame)
+
+    def patchOutPut(self):
+        """
+        Rewrite only the units of the nodes and edges changed in the frame
+        """
+        shown = self.getShownPanes()
+        nodes = self.data["Node"]
+        for pane, views, unit, frame in self.getOutputSources():
+            if pane.stale:
+                continue
+            if pane not in shown:
+                pane.stale = True
+                continue
+            dirty = self.dirtyNodes if views is nodes else self.dirtyLines
+            pane.update({tag: tag in views for tag in sorted(dirty)})
+
+    def formatUnit(self, views, unit, tag):
+        return unit(views[tag])
+
+    def handleTabChange(self, event):
+        self.updateOutPut(force=False)
+
+    def showPaneMenu(self, menu, event):
+        menu.post(event.x_root, event.y_root)
+
+    def writePane(self, stream, pane):
+        """
+        Write the whole output of a pane, whatever part of it is shown
+        """
+        for thisPane, views, unit, frame in self.getOutputSources():
+            if thisPane is pane:
+                writeOutput(stream, views.values(), unit, frame)
+
+    def copyOutput(self, pane):
+        stream = StringIO()
+        self.writePane(stream, pane)
+        self.mainWin.clipboard_clear()
+        self.mainWin.clipboard_append(stream.getvalue())
+
+    def saveOutput(self, pane):
+        try:
+            obj = asksaveasfile(
+                title="Save Graph Output",
+                mode="wb",
+                filetypes=(("Text", "*.txt"), ),
+                defaultextension=".txt",
+            )
+            if obj:
+                with TextIOWrapper(obj, encoding="utf-8") as stream:
+                    self.writePane(stream, pane)
+        except:
+            Messagebox.show_error(title="Error", message="Saving Failed")
 
     def linearComb(self, x1, y1, x2, y2, ratio=0.7):
         # offset = 0.1 * max(abs(x1 - x2), abs(y1 - y2))
@@ -1179,50 +1670,80 @@ class GraphMonster:
             y1 * ratio + y2 * (1 - ratio) + offset,
         )
 
-    def reconnect(self, lineId):
-        line = self.data["Line"][lineId]
-        lineCoord = self.getLineCoords(line.node1, line.node2)
-        textCoord = self.linearComb(*lineCoord)
-        self.canvas.coords(lineId, list(lineCoord))
-        self.canvas.coords(line.canvasIds[-1], list(textCoord))
-
-    def drawNode(self, x1, y1, x2, y2):
-        return self.canvas.create_oval(
-            x1,
-            y1,
-            x2,
-            y2,
-            fill=self.COLORBOOK["oval"][self.curTheme.get()],
-            width=self.NODEWIDTH,
-            activeoutline="red",
-        )
+    def reconnect(self, lineTag):
+        line = self.data["Line"][lineTag]
+        self.lineGrid.insertSegment(lineTag, line.node1.x, line.node1.y,
+                                    line.node2.x, line.node2.y)
+        if lineTag in self.lineItems:
+            lineId, textId = self.lineItems[lineTag]
+            lineCoord = self.getLineCoords(line.node1, line.node2)
+            textCoord = self.linearComb(*lineCoord)
+            self.canvas.coords(lineId, list(lineCoord))
+            self.canvas.coords(textId, list(textCoord))
 
-    def drawLine(self, x1, y1, x2, y2):
-        return self.canvas.create_line(
-            x1,
-            y1,
-            x2,
-            y2,
-            width=self.LINEWIDTH,
-            fill=self.COLORBOOK["line"][self.curTheme.get()],
-            activedash=".",
-            activefill="blue",
-            arrow="last",
-        )
+    def syncNode(self, node):
+        """
+        Push the position of the node in the model to the canvas
+        """
+        x, y = node.x, node.y
+        # The dragged node is not in the tiles
+        if node != self.startNode:
+            self.invalidateNode(node, *self.syncedPos[node.tag])
+            self.invalidateNode(node, x, y)
+        self.nodeGrid.insertPoint(node.tag, x, y)
+        self.syncedPos[node.tag] = (x, y)
+        if node.tag in self.nodeItems:
+            nodeId, textId = self.nodeItems[node.tag]
+            self.canvas.coords(nodeId, list(self.getNodeCoords(node)))
+            self.canvas.coords(textId, list(self.toCanvas(x, y)))
+
+    def nodeStyle(self):
+        return {
+            "fill": self.themeColors["oval"],
+            "width": self.NODEWIDTH,
+            "activeoutline": "red",
+            "tags": "node",
+        }
+
+    def lineStyle(self):
+        return {
+            "width": self.LINEWIDTH,
+            "fill": self.themeColors["line"],
+            "activedash": ".",
+            "activefill": "blue",
+            "arrow": "last" if self.lodTier < 3 else "none",
+            "tags": "line",
+        }
 
-    def drawText(self, x, y, mode, text):
-        """ Create a label for:
-            mode = 0: Node
-            mode = 1: Line
+    def textStyle(self, kind):
+        """ Style of a text item of kind:
+            "label": label of a node
+            "weight": weight of an edge
         """
-        return self.canvas.create_text(
-            x,
-            y,
-            font=("", 13, "bold"),
-            text=text,
-            state="disabled",
-            fill=self.COLORBOOK["text"][self.curTheme.get()],
+        hidden = self.lodTier >= (2 if kind == "label" else 1)
+        return {
+            "font": ("", 13, "bold"),
+            "state": "hidden" if hidden else "disabled",
+            "fill": self.themeColors["text"],
+            "tags": kind,
+        }
+
+    def bulkCreate(self, itemType, items, style):
+        """
+        Create one canvas item per element of items (the coordinates, maybe
+        followed by extra options) in a single Tcl call; return their ids
+        """
+        options = []
+        for key, value in style.items():
+            options += ["-" + key, value]
+        ids = self.canvas.tk.call(
+            "gmBulkCreate",
+            str(self.canvas),
+            itemType,
+            tuple(map(tuple, items)),
+            tuple(options),
         )
+        return [int(x) for x in self.canvas.tk.splitlist(ids)]
 
 
 if __name__ == "__main__":
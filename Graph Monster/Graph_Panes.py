@@ -0,0 +1,245 @@
+"""
+Text panes of the graph outputs.
+
+A pane shows the units of the nodes or of the edges in id order, put
+together by a frame (see Graph.output); unit(id) formats one of them.
+
+Up to VIRTUALUNITS elements the whole output is in the Text widget. The
+pane keeps the length of every unit in a Fenwick tree indexed by id, so
+where a unit starts in the text is known in O(log n), and a change
+rewrites only the units it touched.
+
+Past VIRTUALUNITS the pane is virtual: only the ids are kept, one unit is
+shown per line and just the WINDOWROWS lines from the scroll position on
+are formatted. The scrollbar and the wheel move that window.
+
+The Text widget is read-only: offsets into it are only right as long as
+nothing but the pane writes to it.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+class Fenwick:
+    """
+    Prefix sums of an array of integers which grows on demand
+    """
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.build()
+
+    def build(self):
+        self.tree = [0] + self.values
+        for i in range(1, len(self.tree)):
+            j = i + (i & -i)
+            if j < len(self.tree):
+                self.tree[j] += self.tree[i]
+
+    def grow(self, size):
+        if size > len(self.values):
+            self.values += [0] * (max(size, 2 * len(self.values)) -
+                                  len(self.values))
+            self.build()
+
+    def add(self, i, delta):
+        self.values[i] += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        """
+        Sum of the first i values
+        """
+        total = 0
+        i = min(i, len(self.values))
+        while i:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class OutputPane:
+
+    def __init__(self, text, scrollbar, virtualUnits=5000):
+        self.VIRTUALUNITS = virtualUnits
+        self.WINDOWROWS = 100
+        self.WHEELROWS = 3
+        self.PAGEROWS = 20
+        self.text = text
+        self.scrollbar = scrollbar
+        self.unit = str
+        self.left = self.sep = self.right = ""
+        # Set while the output changed but the pane was hidden
+        self.stale = True
+        self.virtual = False
+        # Whole view: {id: unit} of the elements shown; by id, the length
+        # of the unit and its separator, and 1 if shown
+        self.units = {}
+        self.lengths = Fenwick()
+        self.counts = Fenwick()
+        # Virtual view: ids in order, and the index of the first one shown
+        self.tags = []
+        self.top = 0
+        self.scrollbar.configure(command=self.yview)
+        self.text.configure(yscrollcommand=self.setScroll, state="disabled")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.text.bind(sequence, self.handleWheel)
+
+    @contextmanager
+    def editing(self):
+        """
+        Let the pane write to its read-only Text widget
+        """
+        self.text.configure(state="normal")
+        try:
+            yield
+        finally:
+            self.text.configure(state="disabled")
+
+    def reset(self, tags, unit, frame):
+        """
+        Show the elements of ids tags, in order, within frame
+        """
+        self.unit = unit
+        self.left, self.sep, self.right = frame
+        self.stale = False
+        tags = list(tags)
+        self.virtual = len(tags) > self.VIRTUALUNITS
+        if self.virtual:
+            self.units = {}
+            self.tags = tags
+            self.text.configure(wrap="none")
+            self.render()
+            return
+        self.tags = []
+        self.units = {tag: unit(tag) for tag in tags}
+        size = max(self.units, default=-1) + 1
+        lengths, counts = [0] * size, [0] * size
+        for tag, text in self.units.items():
+            lengths[tag] = len(text) + len(self.sep)
+            counts[tag] = 1
+        self.lengths, self.counts = Fenwick(lengths), Fenwick(counts)
+        self.text.configure(wrap="char")
+        with self.editing():
+            self.text.delete("1.0", "end")
+            self.text.insert(
+                "1.0",
+                self.left + self.sep.join(self.units.values()) + self.right,
+            )
+
+    def index(self, offset):
+        return f"1.0+{offset}c"
+
+    def update(self, changes):
+        """
+        Apply {id: whether the element exists} of the changed elements
+        """
+        if self.virtual:
+            for tag, alive in changes.items():
+                i = bisect_left(self.tags, tag)
+                shown = i < len(self.tags) and self.tags[i] == tag
+                if alive and not shown:
+                    self.tags.insert(i, tag)
+                elif shown and not alive:
+                    del self.tags[i]
+            self.render()
+            return
+        sep = self.sep
+        with self.editing():
+            for tag, alive in changes.items():
+                old = self.units.get(tag)
+                if old is None and not alive:
+                    continue
+                unit = self.unit(tag) if alive else None
+                self.lengths.grow(tag + 1)
+                self.counts.grow(tag + 1)
+                start = len(self.left) + self.lengths.prefix(tag)
+                later = len(self.units) - self.counts.prefix(tag + 1)
+                if old is not None and unit is not None:
+                    self.text.delete(self.index(start),
+                                     self.index(start + len(old)))
+                    self.text.insert(self.index(start), unit)
+                    self.lengths.add(tag, len(unit) - len(old))
+                    self.units[tag] = unit
+                elif unit is None:
+                    # A separator goes with the unit; the last unit has
+                    # none after
+                    if later:
+                        end = start + len(old) + len(sep)
+                    elif len(self.units) > 1:
+                        start, end = start - len(sep), start + len(old)
+                    else:
+                        end = start + len(old)
+                    self.text.delete(self.index(start), self.index(end))
+                    self.lengths.add(tag, -len(old) - len(sep))
+                    self.counts.add(tag, -1)
+                    del self.units[tag]
+                else:
+                    if later:
+                        self.text.insert(self.index(start), unit + sep)
+                    elif self.units:
+                        self.text.insert(self.index(start - len(sep)),
+                                         sep + unit)
+                    else:
+                        self.text.insert(self.index(start), unit)
+                    self.lengths.add(tag, len(unit) + len(sep))
+                    self.counts.add(tag, 1)
+                    self.units[tag] = unit
+        if len(self.units) > self.VIRTUALUNITS:
+            self.reset(sorted(self.units), self.unit, self.getFrame())
+
+    def getFrame(self):
+        return self.left, self.sep, self.right
+
+    def render(self):
+        """
+        Format the window of lines of the virtual view
+        """
+        count = len(self.tags)
+        self.top = max(0, min(self.top, count - self.PAGEROWS))
+        end = min(count, self.top + self.WINDOWROWS)
+        # The separators stay at the end of the lines
+        sep = self.sep.strip("\n")
+        lines = []
+        for i in range(self.top, end):
+            line = self.unit(self.tags[i])
+            if not i:
+                line = self.left + line
+            lines.append(line + (self.right if i == count - 1 else sep))
+        with self.editing():
+            self.text.delete("1.0", "end")
+            self.text.insert("1.0", "\n".join(lines))
+        if count:
+            self.scrollbar.set(self.top / count,
+                               (self.top + self.PAGEROWS) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def setScroll(self, first, last):
+        if not self.virtual:
+            self.scrollbar.set(first, last)
+
+    def yview(self, *args):
+        """
+        Scrollbar command
+        """
+        if not self.virtual:
+            self.text.yview(*args)
+        elif args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.tags))
+            self.render()
+        elif args[0] == "scroll":
+            rows = self.PAGEROWS if args[2] == "pages" else 1
+            self.top += int(args[1]) * rows
+            self.render()
+
+    def handleWheel(self, event):
+        if not self.virtual:
+            return None
+        down = event.num == 5 or event.delta < 0
+        self.top += self.WHEELROWS if down else -self.WHEELROWS
+        self.render()
+        return "break"
@@ -0,0 +1,101 @@
+"""
+Raster tiles of the static part of a graph.
+
+Panning over a large graph is cheap when the canvas only holds a few images
+instead of tens of thousands of items. Tiles are square images laid out on
+the zoomed world plane (world coordinates times the zoom), so a tile stays
+valid as long as its zoom is the current one and nothing in it changed.
+Pillow is needed; TILESUPPORT tells whether it is installed.
+"""
+from collections import OrderedDict
+from Graph.render import arrowHead, loadFont
+
+try:
+    from PIL import Image, ImageDraw, ImageTk
+    TILESUPPORT = True
+except ImportError:
+    TILESUPPORT = False
+
+
+class TileCache:
+    """
+    LRU cache of rendered tiles keyed by (zoom, column, row)
+    """
+
+    def __init__(self, tileSize=512, capacity=64):
+        self.tileSize = tileSize
+        self.capacity = capacity
+        self.tiles = OrderedDict()
+
+    def keysIn(self, zoom, x1, y1, x2, y2):
+        """
+        Keys of the tiles covering a rectangle of the zoomed world plane
+        """
+        size = self.tileSize
+        return {(zoom, i, j)
+                for i in range(int(x1 // size), int(x2 // size) + 1)
+                for j in range(int(y1 // size), int(y2 // size) + 1)}
+
+    def get(self, key):
+        image = self.tiles.get(key)
+        if image is not None:
+            self.tiles.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        self.tiles[key] = image
+        self.tiles.move_to_end(key)
+        while len(self.tiles) > self.capacity:
+            self.tiles.popitem(last=False)
+
+    def touches(self, key, x1, y1, x2, y2, margin=0):
+        """
+        Whether the tile overlaps a world rectangle grown by margin pixels
+        """
+        zoom, i, j = key
+        size = self.tileSize
+        return x1 * zoom - margin < (i + 1) * size and \
+            x2 * zoom + margin > i * size and \
+            y1 * zoom - margin < (j + 1) * size and \
+            y2 * zoom + margin > j * size
+
+    def invalidate(self, x1, y1, x2, y2, margin=0):
+        for key in [x for x in self.tiles if self.touches(x, x1, y1, x2, y2, margin)]:
+            del self.tiles[key]
+
+    def clear(self):
+        self.tiles.clear()
+
+
+def renderTile(size, left, top, lines, ovals, texts, style):
+    """
+    Draw canvas primitives into a transparent size x size image whose top
+    left corner is the canvas point (left, top).
+        lines: (x1, y1, x2, y2, arrow)
+        ovals: (x1, y1, x2, y2)
+        texts: (x, y, text)
+        style: colors of "line", "oval" and "text", "lineWidth", "nodeWidth"
+            and "fontSize"
+    """
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    width = style["lineWidth"]
+    for x1, y1, x2, y2, arrow in lines:
+        x1, y1, x2, y2 = x1 - left, y1 - top, x2 - left, y2 - top
+        draw.line((x1, y1, x2, y2), fill=style["line"], width=width)
+        if arrow:
+            draw.polygon(arrowHead(x1, y1, x2, y2, width), fill=style["line"])
+    for x1, y1, x2, y2 in ovals:
+        draw.ellipse((x1 - left, y1 - top, x2 - left, y2 - top),
+                     fill=style["oval"],
+                     outline="black",
+                     width=style["nodeWidth"])
+    font = loadFont(style["fontSize"])
+    for x, y, text in texts:
+        draw.text((x - left, y - top), text, fill=style["text"], font=font,
+                  anchor="mm")
+    return image
+
+
+def toPhotoImage(image, master):
+    return ImageTk.PhotoImage(image, master=master)